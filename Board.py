@@ -2,10 +2,87 @@ import random
 import math
 import matplotlib.pyplot as plt
 import numpy as np
-from shapely.geometry import LineString
 from Point import Point
 
 
+# sign of cross product (b - a) x (c - a) for arrays of points
+def orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+# is point c on segment ab (when a, b, c are collinear)
+def on_segment(ax, ay, bx, by, cx, cy):
+    return (np.minimum(ax, bx) <= cx) & (cx <= np.maximum(ax, bx)) & (np.minimum(ay, by) <= cy) & (cy <= np.maximum(ay, by))
+
+
+# which of segments (rows x1, y1, x2, y2) have common point with segment (touching counts too)
+def segments_intersect(segment, segments):
+    px1, py1, px2, py2 = segment
+    qx1, qy1, qx2, qy2 = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+    d1 = orientation(qx1, qy1, qx2, qy2, px1, py1)
+    d2 = orientation(qx1, qy1, qx2, qy2, px2, py2)
+    d3 = orientation(px1, py1, px2, py2, qx1, qy1)
+    d4 = orientation(px1, py1, px2, py2, qx2, qy2)
+    crossing = (d1 * d2 < 0) & (d3 * d4 < 0)
+    if not ((d1 == 0) | (d2 == 0) | (d3 == 0) | (d4 == 0)).any(): # no collinear points - no touching
+        return crossing
+    touching = ((d1 == 0) & on_segment(qx1, qy1, qx2, qy2, px1, py1)) | ((d2 == 0) & on_segment(qx1, qy1, qx2, qy2, px2, py2)) \
+        | ((d3 == 0) & on_segment(px1, py1, px2, py2, qx1, qy1)) | ((d4 == 0) & on_segment(px1, py1, px2, py2, qx2, qy2))
+    return crossing | touching
+
+
+# k nearest points of every point (rows sorted by distance, ties by number of point), found with uniform grid
+def nearest_neighbours(coords, k, width, height):
+    n = len(coords)
+    nearest = np.zeros((n, k), dtype=np.int32)
+    if k == 0:
+        return nearest
+    size = max(1.0, math.sqrt(max(width, 1) * max(height, 1) * k / (4 * n))) # about k/4 points per cell
+    cells = np.floor(coords / size).astype(np.int64)
+    grid = {}
+    for i, cell in enumerate(map(tuple, cells)):
+        grid.setdefault(cell, []).append(i)
+    max_ring = int(max(width, height) // size) + 1
+
+    for (cx, cy), members in grid.items():
+        members = np.array(members)
+        ring = 1
+        while True:
+            candidates = [i for x in range(cx - ring, cx + ring + 1) for y in range(cy - ring, cy + ring + 1) for i in grid.get((x, y), ())]
+            candidates = np.sort(np.array(candidates))
+            distances = np.hypot(coords[members, None, 0] - coords[None, candidates, 0], coords[members, None, 1] - coords[None, candidates, 1])
+            distances[members[:, None] == candidates[None, :]] = np.inf # point itself
+            if len(candidates) > k:
+                order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+                # points within ring * size are surely in searched cells
+                if ring >= max_ring or np.take_along_axis(distances, order, axis=1)[:, -1].max() <= ring * size:
+                    nearest[members] = candidates[order]
+                    break
+            elif ring >= max_ring:
+                raise ValueError("Not enough points for k nearest neighbours.")
+            ring += 1
+    return nearest
+
+
+# the same test for one pair of segments - cheaper than arrays for a few links
+def segment_pair_intersects(p, q):
+    def orient(ax, ay, bx, by, cx, cy):
+        cross = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        return (cross > 0) - (cross < 0)
+
+    def on(ax, ay, bx, by, cx, cy):
+        return min(ax, bx) <= cx <= max(ax, bx) and min(ay, by) <= cy <= max(ay, by)
+
+    d1 = orient(q[0], q[1], q[2], q[3], p[0], p[1])
+    d2 = orient(q[0], q[1], q[2], q[3], p[2], p[3])
+    d3 = orient(p[0], p[1], p[2], p[3], q[0], q[1])
+    d4 = orient(p[0], p[1], p[2], p[3], q[2], q[3])
+    if d1 * d2 < 0 and d3 * d4 < 0:
+        return True
+    return (d1 == 0 and on(q[0], q[1], q[2], q[3], p[0], p[1])) or (d2 == 0 and on(q[0], q[1], q[2], q[3], p[2], p[3])) \
+        or (d3 == 0 and on(p[0], p[1], p[2], p[3], q[0], q[1])) or (d4 == 0 and on(p[0], p[1], p[2], p[3], q[2], q[3]))
+
+
 class Board:
 
     def __init__(self, width=0, height=0):
@@ -13,6 +90,12 @@ class Board:
         self.__height = height
         self.__points = []
         self.__links = []
+        # uniform grid of links - cell -> numbers of links which bounding box covers it
+        self.__grid = {}
+        self.__link_list = [] # coordinates of indexed links as tuples
+        self.__segments = np.zeros((0, 4)) # coordinates of indexed links (x1, y1, x2, y2), more rows than links
+        self.__indexed = 0 # number of indexed links
+        self.__cell_size = 1
 
     @property
     def width(self):
@@ -45,55 +128,106 @@ class Board:
     @links.setter
     def links(self, links):
         self.__links = links
-
-    # makes n random points on board
-    def make_points(self, n):
+        self.__grid = {}
+        self.__link_list = []
+        self.__indexed = 0
+
+    # cells covered by bounding box of segment
+    def cells(self, x1, y1, x2, y2):
+        size = self.__cell_size
+        for cx in range(int(min(x1, x2) // size), int(max(x1, x2) // size) + 1):
+            for cy in range(int(min(y1, y2) // size), int(max(y1, y2) // size) + 1):
+                yield cx, cy
+
+    # adds links not yet in grid
+    def update_index(self):
+        if self.__indexed == len(self.links):
+            return
+        if self.__indexed == 0: # cell size - about one point per cell
+            self.__cell_size = max(1, int(math.sqrt(max(self.width, 1) * max(self.height, 1) / max(len(self.points), 1))))
+        if len(self.links) > len(self.__segments): # room for new links
+            segments = np.zeros((max(2 * len(self.__segments), len(self.links), 16), 4))
+            segments[:self.__indexed] = self.__segments[:self.__indexed]
+            self.__segments = segments
+        for link in self.links[self.__indexed:]:
+            segment = (link[0].x, link[0].y, link[1].x, link[1].y)
+            for cell in self.cells(*segment):
+                self.__grid.setdefault(cell, []).append(self.__indexed)
+            self.__segments[self.__indexed] = segment
+            self.__link_list.append(segment)
+            self.__indexed += 1
+
+    # makes n random points on board, seed - also of links made afterwards
+    def make_points(self, n, seed=15):
         points_to_make = n
-        random.seed(15)
+        random.seed(seed)
+        taken = set(self.points)
         while n > 0:
             x = random.randint(0, self.width)
             y = random.randint(0, self.height)
 
             p = Point(x, y)
-            if p not in self.points:
+            if p not in taken:
                 self.points.append(p)
+                taken.add(p)
                 n -= 1
 
     # checks if link doesn't intersect others
     def is_link_forbidden(self, link_to_check):
-        for link in self.links:
-            if link[0] not in link_to_check and link[1] not in link_to_check:
-                connection_1 = LineString([(link[0].x, link[0].y), (link[1].x, link[1].y)])
-                connection_2 = LineString([(link_to_check[0].x, link_to_check[0].y), (link_to_check[1].x, link_to_check[1].y)])
-                if connection_1.intersects(connection_2):
+        self.update_index()
+        segment = (link_to_check[0].x, link_to_check[0].y, link_to_check[1].x, link_to_check[1].y)
+        near = set()
+        for cell in self.cells(*segment): # only links from the same cells
+            near.update(self.__grid.get(cell, ()))
+        if not near:
+            return False
+        if len(near) <= 48:
+            for i in near:
+                link = self.__link_list[i]
+                if segment[:2] not in (link[:2], link[2:]) and segment[2:] not in (link[:2], link[2:]) and segment_pair_intersects(segment, link):
                     return True
-        return False
-
-    # generates links
-    def make_links(self):
-        # dictionary of possible end points of links
-        dist = {}
-        for point in self.points:
-            dist[point] = []
-            for point2 in self.points:
-                if point != point2:
-                    dist[point].append(point2)
-
-        # sort by distance from start point
-        for key, value in dist.items():
-            value = sorted(value, key=lambda p: math.dist([p.x, p.y], [point.x, point.y]))
+            return False
+        segments = self.__segments[list(near)]
+        # links with common end point are allowed
+        common = ((segments[:, 0] == segment[0]) & (segments[:, 1] == segment[1])) | ((segments[:, 0] == segment[2]) & (segments[:, 1] == segment[3])) \
+            | ((segments[:, 2] == segment[0]) & (segments[:, 3] == segment[1])) | ((segments[:, 2] == segment[2]) & (segments[:, 3] == segment[3]))
+        return bool(segments_intersect(segment, segments[~common]).any())
+
+    # generates links, k - number of nearest points tried for each point (all points if None)
+    def make_links(self, k=None):
+        coords = np.array([(p.x, p.y) for p in self.points], dtype=float).reshape(-1, 2)
+        k = max(0, len(self.points) - 1 if k is None else min(k, len(self.points) - 1)) # no points - no links
+        # possible end points of links, sorted by distance from start point
+        nearest = nearest_neighbours(coords, k, self.width, self.height)
+        following = np.zeros(len(self.points), dtype=np.int64) # first not tried end point of each point
+        tried = set() # pairs of point numbers
+
+        # points with any option to make, position in list for quick removal
+        active = list(range(len(self.points))) if k > 0 else []
+        position = {p: i for i, p in enumerate(active)}
+
+        def deactivate(p):
+            i = position.pop(p)
+            last = active.pop()
+            if last != p: # move last point into the gap
+                active[i] = last
+                position[last] = i
 
         # while there is any option to make
-        while not all(value == [] for value in dist.values()):
-            point = random.choice(self.points)
-            if dist[point]:
-                point_to_connect = dist[point][0]
-                link = (point, point_to_connect)
-                if not self.is_link_forbidden(link):
-                    self.links.append(link)
-                # delete from possible end points
-                dist[point].remove(point_to_connect)
-                dist[point_to_connect].remove(point)
+        while active:
+            p = random.choice(active)
+            while following[p] < k and (min(p, nearest[p, following[p]]), max(p, nearest[p, following[p]])) in tried:
+                following[p] += 1
+            if following[p] == k:
+                deactivate(p)
+                continue
+            q = int(nearest[p, following[p]])
+            link = (self.points[p], self.points[q])
+            if not self.is_link_forbidden(link):
+                self.links.append(link)
+            # delete from possible end points of both points
+            tried.add((min(p, q), max(p, q)))
+            following[p] += 1
 
     def draw_board(self, solution):
         plt.clf()
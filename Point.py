@@ -1,8 +1,10 @@
 class Point:
+    __slots__ = ("__x", "__y", "__hash")
 
     def __init__(self, x, y):
         self.__x = x
         self.__y = y
+        self.__hash = hash((x, y)) # points are dictionary keys - hash computed once
 
     @property
     def x(self):
@@ -11,6 +13,7 @@ class Point:
     @x.setter
     def x(self, x):
         self.__x = x
+        self.__hash = hash((self.__x, self.__y))
 
     @property
     def y(self):
@@ -19,15 +22,16 @@ class Point:
     @y.setter
     def y(self, y):
         self.__y = y
+        self.__hash = hash((self.__x, self.__y))
 
     def __eq__(self, other):
         if isinstance(other, Point):
-            return self.x == other.x and self.y == other.y
+            return self.__x == other.__x and self.__y == other.__y
         else:
             return False
 
     def __hash__(self):
-        return hash((self.x, self.y))
+        return self.__hash
 
     def __repr__(self):
         return "(" + str(self.x) + ", " + str(self.y) + ")"
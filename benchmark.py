@@ -0,0 +1,146 @@
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+from itertools import product
+from typing import Callable, Dict, List, Optional, Tuple
+from csp import CSP, Statistics
+from einstein_riddle import cached_einstein_csp, einstein_csp
+from map_coloring import COLORS, cached_map_coloring_csp, random_board, map_coloring_csp
+
+METHODS: List[str] = ["backtracking", "forward_checking", "mac"]
+VARIABLE_HEURISTICS: List[str] = ["none", "mrv", "dom/wdeg"]
+VALUE_HEURISTICS: List[str] = ["none", "lcv"]
+FIELDS: List[str] = ["instance", "model", "mode", "method", "variable", "value", "time", "steps", "checks", "peak_memory", "solutions", "interrupted"]
+
+
+# (name, builder of fresh csp) of every instance, cache - directory of model cache (instances are built every time if None)
+def instances(sizes: List[int], seeds: List[int], colors: List[int], clues: List[int],
+              cache: Optional[str] = None) -> List[Tuple[str, Callable[[], CSP]]]:
+    result = []
+    for size, seed, color_count in product(sizes, seeds, colors):
+        def build(size=size, seed=seed, color_count=color_count) -> CSP:
+            side = max(10, int((size * 20) ** 0.5)) # about 20 cells per point
+            if cache is not None:
+                return cached_map_coloring_csp(cache, side, side, size, seed, 8, COLORS[:color_count])
+            return map_coloring_csp(random_board(side, side, size, seed, 8), COLORS[:color_count])
+        result.append(("board-%d-s%d-c%d" % (size, seed, color_count), build))
+    for clue_count in clues:
+        if cache is not None:
+            result.append(("riddle-%d" % clue_count, lambda clue_count=clue_count: cached_einstein_csp(cache, clue_count)))
+        else:
+            result.append(("riddle-%d" % clue_count, lambda clue_count=clue_count: einstein_csp(clue_count)))
+    return result
+
+
+def solve(csp: CSP, method: str, variable: str, value: str, all_solutions: bool, max_steps: Optional[int]) -> int:
+    solutions = csp.iter_solutions(method, variable != "none", value == "lcv", limit=None if all_solutions else 1,
+                                   variable_heuristic="mrv" if variable == "none" else variable, cutoff=max_steps)
+    return sum(1 for _ in solutions)
+
+
+# one configuration on one instance - timed run, then run with memory tracing and statistics
+# model - "built" or "cached" (tables loaded from model cache take other numbers of steps)
+def run(name: str, build: Callable[[], CSP], method: str, variable: str, value: str, all_solutions: bool, max_steps: Optional[int],
+        memory: bool, model: str = "built") -> Dict:
+    csp = build()
+    start = time.perf_counter()
+    solutions = solve(csp, method, variable, value, all_solutions, max_steps)
+    elapsed = time.perf_counter() - start
+    record = {"instance": name, "model": model, "mode": "all" if all_solutions else "first", "method": method, "variable": variable, "value": value,
+              "time": round(elapsed, 6), "steps": csp.steps, "checks": None, "peak_memory": None, "solutions": solutions, "interrupted": csp.interrupted}
+    if memory:
+        csp = build()
+        csp.stats = Statistics()
+        tracemalloc.start()
+        solve(csp, method, variable, value, all_solutions, max_steps)
+        record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        record["checks"] = sum(csp.stats.checks.values())
+    return record
+
+
+def save(records: List[Dict], path: str) -> None:
+    with open(path, "w", newline="") as file:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+        else:
+            json.dump(records, file, indent=1)
+
+
+def load(path: str) -> List[Dict]:
+    with open(path, newline="") as file:
+        if not path.endswith(".csv"):
+            return json.load(file)
+        records = list(csv.DictReader(file))
+    for record in records: # csv keeps only strings
+        for field in ("steps", "checks", "peak_memory", "solutions"):
+            record[field] = int(record[field]) if record[field] != "" else None
+        record["time"] = float(record["time"])
+        record["interrupted"] = record["interrupted"] == "True"
+    return records
+
+
+# regressions against baseline: other solution counts, more steps, time slower than tolerance times baseline
+def compare(records: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    key = lambda record: (record["instance"], record.get("model") or "built", record["mode"], record["method"], record["variable"], record["value"])
+    old = {key(record): record for record in baseline}
+    problems = []
+    for record in records:
+        before = old.get(key(record))
+        if before is None:
+            continue
+        name = "/".join(key(record))
+        if record["solutions"] != before["solutions"] and not (record["interrupted"] or before["interrupted"]):
+            problems.append("%s: solutions %s -> %s" % (name, before["solutions"], record["solutions"]))
+        if record["steps"] > before["steps"]:
+            problems.append("%s: steps %s -> %s" % (name, before["steps"], record["steps"]))
+        if record["time"] > tolerance * before["time"] and record["time"] - before["time"] > 0.01: # ignore noise of quick runs
+            problems.append("%s: time %.4f -> %.4f" % (name, before["time"], record["time"]))
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Runs solver configurations over map coloring boards and Einstein riddles.")
+    parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS)
+    parser.add_argument("--variable", nargs="+", default=VARIABLE_HEURISTICS, choices=VARIABLE_HEURISTICS, help="variable heuristics")
+    parser.add_argument("--value", nargs="+", default=VALUE_HEURISTICS, choices=VALUE_HEURISTICS, help="value heuristics")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[10, 20, 40], help="points of boards")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[15], help="seeds of boards")
+    parser.add_argument("--colors", nargs="+", type=int, default=[3, 4], help="numbers of colors of boards")
+    parser.add_argument("--clues", nargs="*", type=int, default=[15, 12], help="clues of riddle variants")
+    parser.add_argument("--all-solutions", action="store_true", help="enumerate all solutions instead of the first one")
+    parser.add_argument("--max-steps", type=int, default=100000, help="steps after which a run is interrupted")
+    parser.add_argument("--no-memory", action="store_true", help="skip run with memory tracing and counted checks")
+    parser.add_argument("--model-cache", help="directory of stored models - instances are loaded instead of built when present")
+    parser.add_argument("--output", help="results file (.json or .csv)")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown against baseline")
+    args = parser.parse_args(argv)
+
+    records = []
+    for name, build in instances(args.sizes, args.seeds, args.colors, args.clues, args.model_cache):
+        for method, variable, value in product(args.methods, args.variable, args.value):
+            record = run(name, build, method, variable, value, args.all_solutions, args.max_steps, not args.no_memory,
+                         "built" if args.model_cache is None else "cached")
+            records.append(record)
+            print("%-22s %-16s %-8s %-4s %10.4fs %9d steps %6d solutions%s" % (name, method, variable, value, record["time"], record["steps"],
+                                                                                  record["solutions"], " (interrupted)" if record["interrupted"] else ""))
+    if args.output:
+        save(records, args.output)
+    if args.baseline:
+        problems = compare(records, load(args.baseline), args.tolerance)
+        for problem in problems:
+            print("REGRESSION", problem)
+        if problems:
+            return 1
+        print("No regressions against", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
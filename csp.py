@@ -1,21 +1,346 @@
-import copy
-from itertools import permutations
-from typing import Generic, TypeVar, Dict, List, Optional
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from copy import copy
+from heapq import heappop, heappush
+from itertools import islice, permutations
+from math import perm
+from typing import Callable, Generic, TypeVar, Dict, Iterator, List, Optional, Set, Tuple, Union
 from abc import abstractmethod
+from time import perf_counter
+import random
+import numpy as np
 
 V = TypeVar('V')
 D = TypeVar('D')
 
+TABLE_ARRAY_SIZE = 64 # tables with bigger domains are revised with array operations, smaller ones with sets
+
 
 class Constraint(Generic[V, D]):
 
     def __init__(self, variables: List[V]) -> None:
         self.variables = variables
 
+    @property
+    def arity(self) -> int:
+        return len(self.variables)
+
     @abstractmethod
     def satisfied(self, assignment: Dict[V, D]) -> bool:
         pass
 
+    # class name under which checks are counted - compiled and renamed constraints give name of original one
+    def kind(self) -> str:
+        return type(self).__name__
+
+    # incremental checking in backtracking search - search keeps state of assigned values of variables,
+    # consistent is then asked instead of satisfied, None - constraint is checked only with satisfied
+    # constraints with state override incremental_state, consistent, assign and unassign together
+    def incremental_state(self):
+        return None
+
+    # would value of variable (already in assignment) fit to values assigned before it (in state)
+    # without state of its own the constraint checks whole assignment
+    def consistent(self, state, variable: V, value: D, assignment: Dict[V, D]) -> bool:
+        return self.satisfied(assignment)
+
+    def assign(self, state, variable: V, value: D) -> None:
+        pass
+
+    def unassign(self, state, variable: V, value: D) -> None:
+        pass
+
+
+# binary constraint compiled to matrix of compatible values (rows - first variable, columns - second)
+class TableConstraint(Constraint[V, D]):
+
+    # table - compatible values computed before (rows and columns in order of domains), constraint is then not checked
+    def __init__(self, constraint: Constraint[V, D], domains: Dict[V, List[D]], table: Optional[np.ndarray] = None) -> None:
+        if constraint.arity != 2:
+            raise ValueError("Only binary constraints can be compiled to a table.")
+        super().__init__(constraint.variables)
+        self.constraint: Constraint[V, D] = constraint
+        self.var1, self.var2 = constraint.variables
+        self.values: Dict[V, List[D]] = {self.var1: list(domains[self.var1]), self.var2: list(domains[self.var2])}
+        self.index: Dict[V, Dict[D, int]] = {var: {val: i for i, val in enumerate(values)} for var, values in self.values.items()}
+
+        if table is None:
+            table = np.zeros((len(self.values[self.var1]), len(self.values[self.var2])), dtype=bool)
+            for i, val1 in enumerate(self.values[self.var1]):
+                for j, val2 in enumerate(self.values[self.var2]):
+                    table[i, j] = constraint.satisfied({self.var1: val1, self.var2: val2})
+        elif table.shape != (len(self.values[self.var1]), len(self.values[self.var2])):
+            raise ValueError("Table does not match domains of constraint.")
+        self.table = table
+        # compatible values of the other variable for each value
+        self.supports: Dict[V, Dict[D, set]] = {
+            self.var1: {val1: {self.values[self.var2][j] for j in np.flatnonzero(self.table[i])} for i, val1 in enumerate(self.values[self.var1])},
+            self.var2: {val2: {self.values[self.var1][i] for i in np.flatnonzero(self.table[:, j])} for j, val2 in enumerate(self.values[self.var2])}}
+
+    def kind(self) -> str:
+        return self.constraint.kind()
+
+    # the same table for other constraint (over variables with the same domains) - table, values and supports are shared
+    def renamed(self, constraint: Constraint[V, D]) -> "TableConstraint[V, D]":
+        var1, var2 = constraint.variables
+        other = copy(self)
+        Constraint.__init__(other, [var1, var2])
+        other.constraint = constraint
+        other.var1, other.var2 = var1, var2
+        other.values = {var1: self.values[self.var1], var2: self.values[self.var2]}
+        other.index = {var1: self.index[self.var1], var2: self.index[self.var2]}
+        other.supports = {var1: self.supports[self.var1], var2: self.supports[self.var2]}
+        return other
+
+    # rows for values of start variable, columns for values of the other one
+    def rows(self, start: V) -> np.ndarray:
+        return self.table if start == self.var1 else self.table.T
+
+    # boolean array over initial domain of variable
+    def mask(self, variable: V, values: List[D]) -> np.ndarray:
+        mask = np.zeros(len(self.values[variable]), dtype=bool)
+        mask[[self.index[variable][val] for val in values]] = True
+        return mask
+
+    def satisfied(self, assignment: Dict[V, D]) -> bool:
+        if self.var1 not in assignment or self.var2 not in assignment:
+            return True
+        return assignment[self.var2] in self.supports[self.var1][assignment[self.var1]]
+
+
+# global constraint - all variables take different values, filtered with maximum matching (Regin)
+class AllDifferent(Constraint[V, D]):
+
+    def __init__(self, variables: List[V]) -> None:
+        super().__init__(variables)
+        self.matching: Dict[V, D] = {} # last found matching, start point for next one
+
+    def satisfied(self, assignment: Dict[V, D]) -> bool:
+        values = [assignment[var] for var in self.variables if var in assignment]
+        return len(values) == len(set(values))
+
+    # state - number of assigned variables with each value
+    def incremental_state(self) -> Dict[D, int]:
+        return {}
+
+    def consistent(self, state: Dict[D, int], variable: V, value: D, assignment: Dict[V, D]) -> bool:
+        return state.get(value, 0) == 0
+
+    def assign(self, state: Dict[D, int], variable: V, value: D) -> None:
+        state[value] = state.get(value, 0) + 1
+
+    def unassign(self, state: Dict[D, int], variable: V, value: D) -> None:
+        state[value] -= 1
+
+    # finds augmenting path from variable (Kuhn's algorithm)
+    def augment(self, variable: V, domains, matching: Dict[V, D], owner: Dict[D, V], visited: set) -> bool:
+        for val in domains[variable]:
+            if val in visited:
+                continue
+            visited.add(val)
+            if val not in owner or self.augment(owner[val], domains, matching, owner, visited):
+                matching[variable] = val
+                owner[val] = variable
+                return True
+        return False
+
+    # removes values which don't belong to any maximum matching, False if there is no matching
+    def propagate(self, domains: "DomainStore[V, D]") -> bool:
+        matching: Dict[V, D] = {}
+        owner: Dict[D, V] = {}
+        for var in self.variables: # values of last matching still in domains
+            if var in self.matching and self.matching[var] not in owner and self.matching[var] in domains[var]:
+                matching[var] = self.matching[var]
+                owner[self.matching[var]] = var
+        for var in self.variables:
+            if var not in matching and not self.augment(var, domains, matching, owner, set()):
+                return False
+        self.matching = matching
+
+        # graph: matched edges variable -> value, other edges value -> variable
+        graph: Dict[Tuple[int, object], List[Tuple[int, object]]] = {}
+        for var in self.variables:
+            graph[(0, var)] = [(1, matching[var])]
+            for val in domains[var]:
+                graph.setdefault((1, val), [])
+                if val != matching[var]:
+                    graph[(1, val)].append((0, var))
+
+        # vertices on alternating paths from free values
+        reached = set(node for node in graph if node[0] == 1 and node[1] not in owner)
+        queue = deque(reached)
+        while len(queue) > 0:
+            for nxt in graph[queue.popleft()]:
+                if nxt not in reached:
+                    reached.add(nxt)
+                    queue.append(nxt)
+
+        component = strongly_connected_components(graph)
+        for var in self.variables:
+            for val in list(domains[var]):
+                if val != matching[var] and (1, val) not in reached and component[(0, var)] != component[(1, val)]:
+                    domains.remove(var, val) # edge in no maximum matching
+        return True
+
+
+# Tarjan's algorithm without recursion, returns component number of each node
+def strongly_connected_components(graph: Dict) -> Dict:
+    index = {}
+    low = {}
+    component = {}
+    stack = []
+    on_stack = set()
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while len(work) > 0:
+            node, successors = work[-1]
+            for nxt in successors:
+                if nxt not in index: # go deeper
+                    index[nxt] = low[nxt] = len(index)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(graph[nxt])))
+                    break
+                elif nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            else: # all successors visited
+                work.pop()
+                if len(work) > 0:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]: # root of component
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component[member] = index[node]
+                        if member == node:
+                            break
+    return component
+
+
+# i-th element (from 1) of Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ... - restart cutoffs
+def luby(i: int) -> int:
+    k = 1
+    while True:
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        if (1 << (k - 1)) <= i < (1 << k) - 1: # inside repeated prefix
+            i -= (1 << (k - 1)) - 1
+            k = 1
+        else:
+            k += 1
+
+
+# cartesian product of iterators, each is read only as far as needed and its items are kept for next rounds
+# (except first one, read once) - last iterator changes fastest
+def lazy_product(iterators: List[Iterator]) -> Iterator[Tuple]:
+    if len(iterators) == 0:
+        yield ()
+        return
+    missing = object()
+    items: List[list] = []
+    for iterator in iterators: # nothing if any iterator is empty
+        item = next(iterator, missing)
+        if item is missing:
+            return
+        items.append([item])
+    finished = [False] * len(iterators)
+    positions = [0] * len(iterators)
+    while True:
+        yield tuple(items[i][position] for i, position in enumerate(positions))
+        i = len(iterators) - 1
+        while i > 0: # odometer - next item of last iterator, carry to previous ones
+            if positions[i] + 1 < len(items[i]):
+                positions[i] += 1
+                break
+            if not finished[i]:
+                item = next(iterators[i], missing)
+                if item is not missing:
+                    items[i].append(item)
+                    positions[i] += 1
+                    break
+                finished[i] = True
+            positions[i] = 0
+            i -= 1
+        if i == 0: # first iterator moves on
+            item = next(iterators[0], missing)
+            if item is missing:
+                return
+            items[0][0] = item
+
+
+# constraint over integer ids of variables, checks original constraint
+class RenamedConstraint(Constraint[int, D]):
+
+    def __init__(self, constraint: Constraint[V, D], ids: Dict[V, int]) -> None:
+        super().__init__([ids[var] for var in constraint.variables])
+        self.constraint: Constraint[V, D] = constraint
+
+    def satisfied(self, assignment: Dict[int, D]) -> bool:
+        return self.constraint.satisfied({var: assignment[i] for var, i in zip(self.constraint.variables, self.variables) if i in assignment})
+
+    def kind(self) -> str:
+        return self.constraint.kind()
+
+
+# one solution from solutions of components
+def merge_solutions(parts: Tuple[Dict, ...]) -> Dict:
+    solution = {}
+    for part in parts:
+        solution.update(part)
+    return solution
+
+
+# values interchangeable on variables - renaming them in any solution gives another solution
+# search tries only the first of values not used yet (the others would give renamed copies of the same subtrees)
+class ValueSymmetry(Generic[V, D]):
+
+    def __init__(self, values: List[D], variables: List[V]) -> None:
+        self.values: List[D] = values
+        self.variables: List[V] = variables
+        self.members: Set[D] = set(values)
+
+    # assigned variables with each value of symmetry
+    def used(self, assignment: Dict[V, D]) -> Dict[D, int]:
+        used: Dict[D, int] = {}
+        for var in self.variables:
+            if var in assignment and assignment[var] in self.members:
+                used[assignment[var]] = used.get(assignment[var], 0) + 1
+        return used
+
+    # values in given order, only the first of unused values of symmetry
+    def restrict(self, used: Dict[D, int], values: List[D]) -> List[D]:
+        kept = []
+        fresh = False
+        for value in values:
+            if value in self.members and used.get(value, 0) == 0:
+                if fresh:
+                    continue
+                fresh = True
+            kept.append(value)
+        return kept
+
+    # renamings of values used in solution - each to distinct value of symmetry, identity first
+    # values used by fixed (given part of solution) are kept, others go only to values not kept
+    def renamings(self, solution: Dict[V, D], fixed: Optional[Dict[V, D]] = None) -> Iterator[Dict[D, D]]:
+        kept = self.used(fixed) if fixed is not None else {}
+        used = [value for value in self.values if value in self.used(solution) and value not in kept]
+        yield dict(zip(used, used))
+        for image in permutations([value for value in self.values if value not in kept], len(used)):
+            if list(image) != used:
+                yield dict(zip(used, image))
+
+    # number of renamings of solution
+    def renaming_count(self, solution: Dict[V, D], fixed: Optional[Dict[V, D]] = None) -> int:
+        kept = self.used(fixed) if fixed is not None else {}
+        used = [value for value in self.used(solution) if value not in kept]
+        return perm(len(self.values) - len(kept), len(used))
+
 
 class Arc(Generic[V]):
 
@@ -25,292 +350,1073 @@ class Arc(Generic[V]):
         self.const = const
 
 
+# domains with a trail of removals, undone on backtrack instead of copying all domains
+class DomainStore(Generic[V, D]):
+
+    def __init__(self, domains: Dict[V, List[D]]) -> None:
+        self.domains: Dict[V, List[D]] = domains # lists are changed in place
+        self.trail: List[Tuple[V, int, D]] = [] # (variable, index, removed value)
+
+    def __getitem__(self, variable: V) -> List[D]:
+        return self.domains[variable]
+
+    def __contains__(self, variable: V) -> bool:
+        return variable in self.domains
+
+    def items(self):
+        return self.domains.items()
+
+    def remove(self, variable: V, value: D) -> None:
+        values = self.domains[variable]
+        index = values.index(value)
+        del values[index]
+        self.trail.append((variable, index, value))
+
+    def assign(self, variable: V, value: D) -> None:
+        for val in list(self.domains[variable]):
+            if val != value:
+                self.remove(variable, val)
+
+    def mark(self) -> int:
+        return len(self.trail)
+
+    def undo(self, mark: int) -> None:
+        while len(self.trail) > mark: # restore in reverse order - keeps original order of values
+            variable, index, value = self.trail.pop()
+            self.domains[variable].insert(index, value)
+
+
+# learned nogoods - partial assignments without any solution, least recently used are forgotten when full
+class NogoodStore(Generic[V, D]):
+
+    def __init__(self, capacity: int = 10000) -> None:
+        self.capacity = capacity
+        self.nogoods: "OrderedDict[int, Dict[V, D]]" = OrderedDict() # id -> nogood, least recently used first
+        self.watches: Dict[Tuple[V, D], Set[int]] = {} # (variable, value) -> ids of nogoods containing it
+        self.counter = 0
+
+    def __len__(self) -> int:
+        return len(self.nogoods)
+
+    def add(self, nogood: Dict[V, D]) -> None:
+        key = self.counter
+        self.counter += 1
+        self.nogoods[key] = nogood
+        for pair in nogood.items():
+            self.watches.setdefault(pair, set()).add(key)
+        if len(self.nogoods) > self.capacity:
+            old_key, old = self.nogoods.popitem(last=False)
+            for pair in old.items():
+                self.watches[pair].discard(old_key)
+                if len(self.watches[pair]) == 0:
+                    del self.watches[pair]
+
+    # nogood fully contained in assignment, only nogoods with just assigned variable can become violated
+    def violated(self, variable: V, assignment: Dict[V, D]) -> Optional[Dict[V, D]]:
+        for key in self.watches.get((variable, assignment[variable]), ()):
+            nogood = self.nogoods[key]
+            if all(var in assignment and assignment[var] == value for var, value in nogood.items()):
+                self.nogoods.move_to_end(key)
+                return nogood
+        return None
+
+    def clear(self) -> None:
+        self.nogoods.clear()
+        self.watches.clear()
+
+
+# unassigned variables in a lazy heap ordered by heuristic score, changed variables are pushed again before selection
+# heuristic: "mrv" - smallest domain, "dom/wdeg" - smallest domain size / weighted degree
+class VariableOrder(Generic[V, D]):
+
+    def __init__(self, csp: "CSP[V, D]", domains: DomainStore[V, D], heuristic: str, rng: Optional[random.Random] = None) -> None:
+        self.csp = csp
+        self.domains = domains
+        self.weighted: bool = heuristic == "dom/wdeg"
+        self.ties: List[float] = [rng.random() if rng is not None else i for i in range(len(csp.variables))] # random or first variable
+        self.index: Dict[V, int] = {var: i for i, var in enumerate(csp.variables)}
+        self.stamps: List[int] = [0] * len(csp.variables) # only entry with actual stamp of variable is valid
+        self.heap: List[Tuple[float, float, int, int]] = [] # (score, tie, index, stamp)
+        self.dirty: Set[V] = set(csp.variables)
+
+    def score(self, variable: V, assignment: Dict[V, D]) -> float:
+        size = len(self.domains[variable])
+        if not self.weighted:
+            return size
+        wdeg = 0 # weights of constraints with another unassigned variable
+        for constr in self.csp.constraints[variable]:
+            if constr.arity > 1 and any(var != variable and var not in assignment for var in constr.variables):
+                wdeg += self.csp.weights.get(constr, 1)
+        return size / wdeg if wdeg > 0 else float("inf")
+
+    # variable was assigned or unassigned, trail - its removals
+    def changed(self, variable: V, trail: List[Tuple[V, int, D]]) -> None:
+        self.dirty.update(var for var, _, _ in trail)
+        if self.weighted:
+            self.dirty.update(self.csp.neighbours[variable])
+
+    def released(self, variable: V) -> None:
+        self.dirty.add(variable)
+
+    def failed(self, constraint: "Constraint[V, D]") -> None:
+        if self.weighted:
+            self.dirty.update(constraint.variables)
+
+    def select(self, assignment: Dict[V, D]) -> V:
+        if len(self.heap) > 4 * len(self.stamps) + 64: # too many stale entries
+            self.heap = []
+            self.dirty = set(self.csp.variables)
+        for var in self.dirty:
+            if var not in assignment:
+                i = self.index[var]
+                self.stamps[i] += 1
+                heappush(self.heap, (self.score(var, assignment), self.ties[i], i, self.stamps[i]))
+        self.dirty.clear()
+        while True:
+            _, _, i, stamp = heappop(self.heap)
+            var = self.csp.variables[i]
+            if stamp == self.stamps[i] and var not in assignment:
+                self.stamps[i] += 1 # pushed again when unassigned
+                return var
+
+
+# search statistics, collected only while csp.stats is set - nothing is counted otherwise
+# on_enter(variable, value, depth) - value assigned, on_exit(variable, depth) - value taken back
+class Statistics:
+
+    def __init__(self, on_enter: Optional[Callable] = None, on_exit: Optional[Callable] = None) -> None:
+        self.nodes = 0 # assignments tried
+        self.failures = 0 # assignments rejected by consistency check or propagation
+        self.backtracks = 0 # variables with all values tried
+        self.max_depth = 0
+        self.revisions = 0 # arcs revised by ac_3
+        self.pruned = 0 # values removed by propagation
+        self.propagation_time = 0.0 # consistency checks and propagation after assignments
+        self.branching_time = 0.0 # choosing variables and ordering their values
+        self.checks: Dict[str, int] = {} # calls of satisfied, table rows and support sets read - by class of original constraint
+        self.check_time: Dict[str, float] = {}
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.watched: List[Constraint] = []
+
+    def enter(self, variable, value, depth: int) -> None:
+        self.nodes += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if self.on_enter is not None:
+            self.on_enter(variable, value, depth)
+
+    def exit(self, variable, depth: int) -> None:
+        if self.on_exit is not None:
+            self.on_exit(variable, depth)
+
+    # checks done without satisfied (compiled tables)
+    def count(self, constraint: Constraint, checks: int) -> None:
+        name = constraint.kind()
+        self.checks[name] = self.checks.get(name, 0) + checks
+
+    # calls of method are counted and timed under name
+    def timed(self, method: Callable, name: str) -> Callable:
+        def checked(*args):
+            started = perf_counter()
+            result = method(*args)
+            self.check_time[name] = self.check_time.get(name, 0.0) + perf_counter() - started
+            self.checks[name] = self.checks.get(name, 0) + 1
+            return result
+        return checked
+
+    # counts and times satisfied of constraints until unwatch, consistent too when constraint has its own
+    # (the default one asks satisfied, which is counted already)
+    def watch(self, constraints: List[Constraint]) -> None:
+        for constraint in constraints:
+            if "satisfied" in vars(constraint): # already replaced
+                continue
+            constraint.satisfied = self.timed(constraint.satisfied, constraint.kind())
+            if type(constraint).consistent is not Constraint.consistent:
+                constraint.consistent = self.timed(constraint.consistent, constraint.kind())
+            self.watched.append(constraint)
+
+    def unwatch(self) -> None:
+        for constraint in self.watched:
+            del constraint.satisfied
+            vars(constraint).pop("consistent", None)
+        self.watched = []
+
+    def as_dict(self) -> Dict:
+        return {"nodes": self.nodes, "failures": self.failures, "backtracks": self.backtracks, "max_depth": self.max_depth,
+                "revisions": self.revisions, "pruned": self.pruned, "propagation_time": self.propagation_time,
+                "branching_time": self.branching_time, "checks": dict(self.checks), "check_time": dict(self.check_time)}
+
+
 class CSP(Generic[V, D]):
     def __init__(self, variables: List[V], domains: Dict[V, List[D]]) -> None:
         self.variables: List[V] = variables
         self.domains: Dict[V, List[D]] = domains
         self.constraints: Dict[V, List[Constraint[V, D]]] = {}
+        # constraint graph - built once in add_constraint
+        self.unary: Dict[V, List[Constraint[V, D]]] = {} # constraints with arity 1
+        self.arcs: List[Arc[V]] = [] # all arcs of constraints with arity > 1
+        self.arcs_from: Dict[V, List[Arc[V]]] = {} # arcs starting in variable
+        self.arcs_to: Dict[V, List[Arc[V]]] = {} # arcs ending in variable
+        self.neighbours: Dict[V, List[V]] = {} # variables sharing a constraint
+        self.global_constraints: Dict[V, List[AllDifferent[V, D]]] = {} # propagated as a whole, no arcs
         for variable in self.variables:
             self.constraints[variable] = []
+            self.global_constraints[variable] = []
+            self.unary[variable] = []
+            self.arcs_from[variable] = []
+            self.arcs_to[variable] = []
+            self.neighbours[variable] = []
             if variable not in self.domains:
                 raise LookupError("Every variable should have a domain.")
+        self.residues: Dict[Tuple[Arc[V], D], D] = {} # last found support of value on arc (ac2001 engine)
+        self.value_index: Dict[V, Dict[D, int]] = {} # position of value in initial domain
+        self.indexed: Optional[CSP[int, D]] = None # the same problem over integer ids of variables
+        self.nogoods: NogoodStore[V, D] = NogoodStore() # learned by backjumping, kept between searches
+        self.weights: Dict[Constraint[V, D], int] = {} # failures caused by constraint + 1 (dom/wdeg), kept between searches
+        self.failed: Optional[Constraint[V, D]] = None # constraint which caused last failure
+        self.supports: Dict[Tuple[Constraint[V, D], V], Tuple[Dict[D, Set[D]], Set[D]]] = {} # binary supports for value ordering
         self.steps = 0
+        self.interrupted = False # last search stopped at its cutoff before searching whole tree
+        self.stats: Optional[Statistics] = None # set to collect statistics of searches
+        self.value_symmetries: List[ValueSymmetry[V, D]] = [] # broken by search
 
     def add_constraint(self, constraint: Constraint[V, D]) -> None:
         for variable in constraint.variables:
-            if variable not in self.variables:
+            if variable not in self.constraints:
                 raise LookupError("Variable in constraint not in variable list")
-            else:
-                self.constraints[variable].append(constraint)
-
-    def check_consistency(self, variable: V, assignment: Dict[V, D]) -> bool:
-        for constraint in self.constraints[variable]:
-            if not constraint.satisfied(assignment):
-                return False
-        return True
+        for variable in constraint.variables:
+            self.constraints[variable].append(constraint)
+        self.indexed = None
 
-    def backtracking_search(self, variable_bool: bool, value_bool: bool, single_bool: bool, assignment=None) -> Optional[List[Dict[V, D]]]:
+        if constraint.arity == 1:
+            self.unary[constraint.variables[0]].append(constraint)
+            return
+        for start, end in permutations(constraint.variables, 2): # pairs of variables in constraint
+            if end not in self.neighbours[start]:
+                self.neighbours[start].append(end)
+        if isinstance(constraint, AllDifferent):
+            for variable in constraint.variables:
+                self.global_constraints[variable].append(constraint)
+            return
+        for start, end in permutations(constraint.variables, 2):
+            arc = Arc(start, end, constraint)
+            self.arcs.append(arc)
+            self.arcs_from[start].append(arc)
+            self.arcs_to[end].append(arc)
 
-        results = []
-        if assignment is None:
-            assignment = {}
-        # all variables are assigned
-        if len(assignment) == len(self.variables):
-            if single_bool:
-                return assignment
-            else:
-                return [assignment]
+    # values interchangeable on variables (all variables by default) in every constraint - e.g. colors of map
+    # variables must have all of the values in their domains or none of them
+    def add_value_symmetry(self, values: List[D], variables: Optional[List[V]] = None) -> None:
+        variables = list(self.variables if variables is None else variables)
+        for variable in variables:
+            if variable not in self.domains:
+                raise LookupError("Variable in value symmetry not in variable list")
+            present = sum(1 for value in values if value in self.domains[variable])
+            if 0 < present < len(values):
+                raise ValueError("Variable " + str(variable) + " has only some of interchangeable values")
+        for symmetry in self.value_symmetries:
+            if symmetry.members.intersection(values) and set(symmetry.variables).intersection(variables):
+                raise ValueError("Value symmetries overlap")
+        self.value_symmetries.append(ValueSymmetry(list(values), variables))
+        self.indexed = None
 
-        # unassigned variables
-        unassigned: List[V] = [v for v in self.variables if v not in assignment]
+    # all solutions which differ from solution only by renaming values of symmetries, solution itself first
+    # values used by fixed (given part of solution) are not renamed
+    def symmetric_solutions(self, solution: Dict[V, D], fixed: Optional[Dict[V, D]] = None) -> Iterator[Dict[V, D]]:
+        symmetries = [symmetry for symmetry in self.value_symmetries if any(var in solution for var in symmetry.variables)]
+        for renamings in lazy_product([symmetry.renamings(solution, fixed) for symmetry in symmetries]):
+            image = dict(solution)
+            for symmetry, renaming in zip(symmetries, renamings):
+                for var in symmetry.variables:
+                    if var in solution and solution[var] in renaming:
+                        image[var] = renaming[solution[var]]
+            yield image
 
-        # VARIABLE
-        first: V = unassigned[0]
-        if variable_bool:
-            first: V = self.minimum_remaining_values_heuristic(unassigned, self.domains)[0]
+    # number of symmetric_solutions of solution
+    def symmetric_count(self, solution: Dict[V, D], fixed: Optional[Dict[V, D]] = None) -> int:
+        count = 1
+        for symmetry in self.value_symmetries:
+            if any(var in solution for var in symmetry.variables):
+                count *= symmetry.renaming_count(solution, fixed)
+        return count
 
-        #VALUE
-        values = self.domains[first]
-        if value_bool:
-            values = self.least_constraining_value_heuristic(first, self.domains, assignment)
+    # replaces binary constraints with compiled tables over current domains
+    def compile_constraints(self) -> None:
+        compiled: Dict[Constraint[V, D], TableConstraint[V, D]] = {}
+        for arc in self.arcs:
+            if arc.const.arity == 2 and not isinstance(arc.const, TableConstraint):
+                if arc.const not in compiled:
+                    compiled[arc.const] = TableConstraint(arc.const, self.domains)
+                arc.const = compiled[arc.const]
+        for variable, constraints in self.constraints.items():
+            self.constraints[variable] = [compiled.get(constr, constr) for constr in constraints]
 
-        for value in values:
-            local_assignment = assignment.copy()
-            local_assignment[first] = value
-            self.steps += 1
+    # the same problem over variables 0..n-1 (positions in self.variables), binary constraints compiled to tables
+    def integer_csp(self) -> "CSP[int, D]":
+        if self.indexed is None:
+            ids = {var: i for i, var in enumerate(self.variables)}
+            indexed: CSP[int, D] = CSP(list(range(len(self.variables))), {ids[var]: self.domains[var] for var in self.variables})
+            for constraint in dict.fromkeys(constr for var in self.variables for constr in self.constraints[var]):
+                if isinstance(constraint, AllDifferent):
+                    indexed.add_constraint(AllDifferent([ids[var] for var in constraint.variables]))
+                elif constraint.arity == 2:
+                    indexed.add_constraint(TableConstraint(RenamedConstraint(constraint, ids), indexed.domains))
+                else:
+                    indexed.add_constraint(RenamedConstraint(constraint, ids))
+            for symmetry in self.value_symmetries:
+                indexed.add_value_symmetry(symmetry.values, [ids[var] for var in symmetry.variables])
+            self.indexed = indexed
+        return self.indexed
 
-            if self.check_consistency(first, local_assignment):
-                result: Optional[List[Dict[V, D]]] = self.backtracking_search(variable_bool, value_bool, single_bool, local_assignment)
+    # records constraint which caused failure, returns False
+    def fail(self, constraint: Constraint[V, D]) -> bool:
+        self.weights[constraint] = self.weights.get(constraint, 1) + 1
+        self.failed = constraint
+        return False
 
-                # add new solution to results
-                if result is not None:
-                    if single_bool:
-                        return result
-                    else:
-                        results.extend(result)
-        if single_bool:
-            return None
-        if results is not None and len(results) != 0:
-            return results
-        else:
-            return None
+    def check_consistency(self, variable: V, assignment: Dict[V, D]) -> bool:
+        return self.find_conflict(variable, assignment) is None
 
-    def mac(self, variable_bool: bool, value_bool: bool, single_bool: bool, domains, assignment=None) -> Optional[List[Dict[V, D]]]:
-        results = []
-        if assignment is None:
-            assignment = {}
-        # all variables are assigned
-        if len(assignment) == len(self.variables):
-            if single_bool:
-                return assignment
+    # variables of first violated constraint or nogood with variable, None when assignment is consistent
+    # states - of incremental constraints, they are checked with values assigned before variable
+    def find_conflict(self, variable: V, assignment: Dict[V, D], states: Optional[Dict[Constraint[V, D], object]] = None) -> Optional[List[V]]:
+        for constraint in self.constraints[variable]:
+            if states is not None and constraint in states:
+                consistent = constraint.consistent(states[constraint], variable, assignment[variable], assignment)
             else:
-                return [assignment]
-
-        # unassigned variables
-        unassigned: List[V] = [v for v in self.variables if v not in assignment]
+                consistent = constraint.satisfied(assignment)
+            if not consistent:
+                self.fail(constraint)
+                return constraint.variables
+        if len(self.nogoods) > 0:
+            nogood = self.nogoods.violated(variable, assignment)
+            if nogood is not None:
+                return list(nogood)
+        return None
 
-        # VARIABLE
-        first: V = unassigned[0]
-        if variable_bool:
-            first: V = self.minimum_remaining_values_heuristic(unassigned, domains)[0]
+    # states of incremental constraints with values of given assignment
+    def incremental_states(self, assignment: Dict[V, D]) -> Dict[Constraint[V, D], object]:
+        states: Dict[Constraint[V, D], object] = {}
+        for var in self.variables:
+            for constr in self.constraints[var]:
+                if constr not in states:
+                    state = constr.incremental_state()
+                    if state is not None:
+                        states[constr] = state
+        for var, value in assignment.items():
+            for constr in self.constraints[var]:
+                if constr in states:
+                    constr.assign(states[constr], var, value)
+        return states
 
-        # VALUE
-        values = domains[first]
-        if value_bool:
-            values = self.least_constraining_value_heuristic(first, domains, assignment)
+    def backtracking_search(self, variable_bool: bool, value_bool: bool, single_bool: bool, assignment=None,
+                            backjumping: bool = False, variable_heuristic: str = "mrv") -> Optional[List[Dict[V, D]]]:
+        return self.collect_solutions(self.iter_solutions("backtracking", variable_bool, value_bool, assignment=assignment,
+                                                          backjumping=backjumping, variable_heuristic=variable_heuristic), single_bool)
 
-        for value in values:
-            dom = copy.deepcopy(domains)
-            local_assignment = assignment.copy()
-            local_assignment[first] = value
-            self.steps += 1
-            dom[first] = [value]
+    def mac(self, variable_bool: bool, value_bool: bool, single_bool: bool, domains, assignment=None, engine: str = "ac3",
+            variable_heuristic: str = "mrv") -> Optional[List[Dict[V, D]]]:
+        return self.collect_solutions(self.iter_solutions("mac", variable_bool, value_bool, domains=domains, assignment=assignment, engine=engine,
+                                                          variable_heuristic=variable_heuristic), single_bool)
 
-            if not self.ac_3(dom, local_assignment): # next value if not satisfied
-                continue
-            else:
-                result: Optional[List[Dict[V, D]]] = self.mac(variable_bool, value_bool, single_bool, dom, local_assignment)
+    def forward_checking(self, variable_bool: bool, value_bool: bool, single_bool: bool, domains, assignment=None,
+                         variable_heuristic: str = "mrv") -> Optional[List[Dict[V, D]]]:
+        return self.collect_solutions(self.iter_solutions("forward_checking", variable_bool, value_bool, domains=domains, assignment=assignment,
+                                                          variable_heuristic=variable_heuristic), single_bool)
 
-                # add new solution to results
-                if result is not None:
-                    if single_bool:
-                        return result
-                    else:
-                        results.extend(result)
+    # first solution or list of all solutions, None if there is no solution
+    def collect_solutions(self, solutions: Iterator[Dict[V, D]], single_bool: bool):
         if single_bool:
-            return None
-        if results is not None and len(results) != 0:
+            return next(solutions, None)
+        results = list(solutions)
+        if len(results) != 0:
             return results
         else:
             return None
 
-    def forward_checking(self, variable_bool: bool, value_bool: bool, single_bool: bool, domains, assignment=None) -> Optional[List[Dict[V, D]]]:
-
-        results = []
+    # groups of variables connected by constraints, variables of each in order of self.variables
+    def components(self) -> List[List[V]]:
+        position = {var: i for i, var in enumerate(self.variables)}
+        component: Dict[V, int] = {}
+        groups: List[List[V]] = []
+        for start in self.variables:
+            if start in component:
+                continue
+            component[start] = len(groups)
+            group = [start]
+            stack = [start]
+            while len(stack) > 0:
+                var = stack.pop()
+                for other in self.neighbours[var]:
+                    if other not in component:
+                        component[other] = len(groups)
+                        group.append(other)
+                        stack.append(other)
+            groups.append(sorted(group, key=position.__getitem__))
+        return groups
 
-        if assignment is None:
-            assignment = {}
-        # all variables are assigned
-        if len(assignment) == len(self.variables):
-            if single_bool:
-                return assignment
-            else:
-                return [assignment]
+    # the problem restricted to variables of one component - same domains and constraint objects
+    def subproblem(self, variables: List[V]) -> "CSP[V, D]":
+        sub: CSP[V, D] = CSP(list(variables), {var: self.domains[var] for var in variables})
+        sub.stats = self.stats # searches of components are counted together
+        for constraint in dict.fromkeys(constr for var in variables for constr in self.constraints[var]):
+            sub.add_constraint(constraint)
+        inside = set(variables)
+        for symmetry in self.value_symmetries:
+            if inside.intersection(symmetry.variables):
+                sub.add_value_symmetry(symmetry.values, [var for var in symmetry.variables if var in inside])
+        return sub
 
-        # unassigned variables
-        unassigned: List[V] = [v for v in self.variables if v not in assignment]
+    # solutions combined from components solved separately, options as in iter_solutions (without domains and assignment)
+    # solutions of components are found lazily, all of them are kept except those of the biggest component
+    def iter_decomposed_solutions(self, method: str = "backtracking", variable_bool: bool = False, value_bool: bool = False,
+                                  limit: Optional[int] = None, **options) -> Iterator[Dict[V, D]]:
+        subproblems = [self.subproblem(variables) for variables in sorted(self.components(), key=len, reverse=True)]
+        try:
+            solutions = (merge_solutions(parts) for parts in lazy_product(
+                [sub.iter_solutions(method, variable_bool, value_bool, **options) for sub in subproblems]))
+            if limit is not None:
+                solutions = islice(solutions, limit)
+            yield from solutions
+        finally:
+            self.steps += sum(sub.steps for sub in subproblems)
 
-        # VARIABLE
-        first: V = unassigned[0]
-        if variable_bool:
-            first: V = self.minimum_remaining_values_heuristic(unassigned, domains)[0]
+    # number of solutions without building them - forward checking search over components of unassigned variables
+    # counts of residual components are cached by their variables and current domains (and assigned values of their
+    # constraints with arity > 2), the least recently used are forgotten when cache_size is exceeded
+    def count_solutions(self, assignment: Optional[Dict[V, D]] = None, cache_size: int = 100000) -> int:
+        stats = self.stats
+        if stats is not None: # counts checks of constraints, preprocessing included
+            stats.watch(list(dict.fromkeys(constr for constraints in self.constraints.values() for constr in constraints)))
+        try:
+            domains = DomainStore({var: list(values) for var, values in self.domains.items()})
+            if not self.apply_unary_constraints(domains):
+                return 0
+            assignment = {} if assignment is None else dict(assignment)
+            for var, value in assignment.items():
+                if value not in domains[var]:
+                    return 0
+                domains.assign(var, value)
+            for var in assignment:
+                if not self.forward_checking_helper(var, domains, assignment) or not self.check_consistency(var, assignment):
+                    return 0
+            cache: "OrderedDict[tuple, int]" = OrderedDict()
+            count = 1
+            for variables in self.residual_components([var for var in self.variables if var not in assignment]):
+                # counters wait for counts of components below them - explicit stack instead of recursion
+                stack = [self.component_counter(variables, domains, assignment, cache, cache_size)]
+                result = None
+                while len(stack) > 0:
+                    try:
+                        stack.append(self.component_counter(stack[-1].send(result), domains, assignment, cache, cache_size))
+                        result = None
+                    except StopIteration as stop:
+                        stack.pop()
+                        result = stop.value
+                if result == 0:
+                    return 0
+                count *= result
+            return count
+        finally:
+            if stats is not None:
+                stats.unwatch()
 
-        # VALUE
-        values = domains[first]
-        if value_bool:
-            values = self.least_constraining_value_heuristic(first, domains, assignment)
+    # variables split by constraints among them, smallest groups first
+    def residual_components(self, variables: List[V]) -> List[List[V]]:
+        free = set(variables)
+        seen: Set[V] = set()
+        groups: List[List[V]] = []
+        for start in variables:
+            if start in seen:
+                continue
+            seen.add(start)
+            group = [start]
+            stack = [start]
+            while len(stack) > 0:
+                for other in self.neighbours[stack.pop()]:
+                    if other in free and other not in seen:
+                        seen.add(other)
+                        group.append(other)
+                        stack.append(other)
+            groups.append(group)
+        return sorted(groups, key=len)
 
-        for value in values:
-            dom = copy.deepcopy(domains)
-            local_assignment = assignment.copy()
-            local_assignment[first] = value
+    # counts solutions of component of unassigned variables, yields components below each value and receives their counts
+    def component_counter(self, variables: List[V], domains: DomainStore[V, D], assignment: Dict[V, D],
+                          cache: "OrderedDict[tuple, int]", cache_size: int) -> Iterator[List[V]]:
+        context = frozenset((var, assignment[var]) for other in variables for constr in self.constraints[other]
+                            if constr.arity > 2 and not isinstance(constr, AllDifferent) for var in constr.variables if var in assignment)
+        key = (frozenset((var, tuple(domains[var])) for var in variables), context)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        variable = min(variables, key=lambda var: (len(domains[var]), -len(self.neighbours[var])))
+        rest = [var for var in variables if var != variable]
+        stats = self.stats
+        total = 0
+        for value in list(domains[variable]):
             self.steps += 1
-            dom[first] = [value]
+            mark = domains.mark()
+            assignment[variable] = value
+            if stats is not None:
+                stats.enter(variable, value, len(assignment))
+                started = perf_counter()
+            domains.assign(variable, value)
+            assigned = domains.mark()
+            consistent = self.forward_checking_helper(variable, domains, assignment) and \
+                all(constr.satisfied(assignment) for constr in self.constraints[variable] if constr.arity > 2)
+            if stats is not None:
+                stats.pruned += domains.mark() - assigned
+                stats.propagation_time += perf_counter() - started
+                if not consistent:
+                    stats.failures += 1
+            if consistent:
+                product = 1
+                for part in self.residual_components(rest):
+                    product *= yield part
+                    if product == 0:
+                        break
+                total += product
+            domains.undo(mark)
+            del assignment[variable]
+            if stats is not None:
+                stats.exit(variable, len(assignment) + 1)
+        if stats is not None:
+            stats.backtracks += 1
+        cache[key] = total
+        if len(cache) > cache_size:
+            cache.popitem(last=False)
+        return total
 
-            if not self.forward_checking_helper(first, dom, local_assignment):  # next value if not satisfied
-                continue
+    # first solution, search is restarted with other random tie-breaking whenever it exceeds its step cutoff
+    # schedule: "luby" - cutoffs base * (1, 1, 2, 1, 1, 2, 4, ...), "geometric" - base * factor ** restart
+    # base - number of variables by default, fewer steps can not reach a solution
+    # constraint weights (dom/wdeg) and nogoods (backjumping) learned by earlier runs are kept
+    # None if there is no solution or max_restarts runs were all cut off (then interrupted is True)
+    def restart_search(self, method: str = "mac", variable_bool: bool = True, value_bool: bool = False, schedule: str = "luby",
+                       base: Optional[int] = None, factor: float = 1.5, seed: int = 0, max_restarts: Optional[int] = None, engine: str = "ac3",
+                       variable_heuristic: str = "dom/wdeg", backjumping: bool = False, integer_ids: bool = False) -> Optional[Dict[V, D]]:
+        if schedule not in ("luby", "geometric"):
+            raise ValueError("Unknown restart schedule: " + str(schedule))
+        if base is None:
+            base = len(self.variables)
+        rng = random.Random(seed) # seeds of runs
+        run = 0
+        while max_restarts is None or run < max_restarts:
+            cutoff = base * luby(run + 1) if schedule == "luby" else int(base * factor ** run)
+            solution = next(self.iter_solutions(method, variable_bool, value_bool, engine=engine, seed=rng.randrange(2 ** 32),
+                                                integer_ids=integer_ids, backjumping=backjumping, variable_heuristic=variable_heuristic,
+                                                cutoff=cutoff), None)
+            if solution is not None or not self.interrupted: # solution or whole tree searched
+                return solution
+            run += 1
+        return None
+
+    # yields every solution as soon as it is found, method: "backtracking", "forward_checking" or "mac"
+    # max_depth - yields consistent partial assignments of first max_depth search levels instead
+    # seed - random tie-breaking of heuristics (random order of values without value heuristic)
+    # integer_ids - search runs on integer_csp, solutions are translated back
+    # cutoff - search stops after this many steps, interrupted is then True
+    # symmetry: "expand" - value symmetries are broken, every solution found yields all its renamings,
+    # "canonical" - only one solution of each group of renamings, "none" - symmetries are ignored
+    # partial assignments of max_depth are never expanded - search below each of them expands its solutions
+    def iter_solutions(self, method: str = "backtracking", variable_bool: bool = False, value_bool: bool = False, limit: Optional[int] = None,
+                       domains=None, assignment=None, engine: str = "ac3", max_depth: Optional[int] = None, seed: Optional[int] = None,
+                       integer_ids: bool = False, backjumping: bool = False, variable_heuristic: str = "mrv",
+                       cutoff: Optional[int] = None, symmetry: str = "expand") -> Iterator[Dict[V, D]]:
+        if method not in ("backtracking", "forward_checking", "mac"):
+            raise ValueError("Unknown search method: " + str(method))
+        if backjumping and method != "backtracking":
+            raise ValueError("Backjumping is only supported by backtracking search")
+        if variable_heuristic not in ("mrv", "dom/wdeg"):
+            raise ValueError("Unknown variable heuristic: " + str(variable_heuristic))
+        if symmetry not in ("expand", "canonical", "none"):
+            raise ValueError("Unknown symmetry handling: " + str(symmetry))
+        self.interrupted = False
+        if integer_ids:
+            indexed = self.integer_csp()
+            ids = {var: i for i, var in enumerate(self.variables)}
+            if domains is not None:
+                for var, values in domains.items(): # tables of integer_csp are compiled over domains of CSP
+                    if any(val not in self.domains[var] for val in values):
+                        raise ValueError("Domain of " + str(var) + " has values unknown to compiled constraints")
+                domains = {ids[var]: values for var, values in domains.items()}
+            if assignment is not None:
+                assignment = {ids[var]: value for var, value in assignment.items()}
+            steps = indexed.steps
+            indexed.stats = self.stats
+            for solution in indexed.iter_solutions(method, variable_bool, value_bool, limit, domains, assignment, engine, max_depth, seed,
+                                                   backjumping=backjumping, variable_heuristic=variable_heuristic, cutoff=cutoff,
+                                                   symmetry=symmetry):
+                self.steps += indexed.steps - steps
+                steps = indexed.steps
+                yield {self.variables[i]: value for i, value in solution.items()}
+            self.steps += indexed.steps - steps
+            self.interrupted = indexed.interrupted
+            return
+        stats = self.stats
+        if stats is not None: # counts checks of constraints, preprocessing included
+            stats.watch(list(dict.fromkeys(constr for constraints in self.constraints.values() for constr in constraints)))
+        try:
+            if domains is None:
+                domains = self.domains
+            elif domains is not self.domains:
+                self.check_table_domains(domains)
+            assignment = {} if assignment is None else dict(assignment)
+            if method == "backtracking": # domains are only read
+                store = DomainStore(domains) if not isinstance(domains, DomainStore) else domains
+            else: # own copy of domains, shared by whole search
+                store = DomainStore({var: list(values) for var, values in domains.items()})
+                for var, value in assignment.items(): # given part of solution
+                    if value not in store[var]:
+                        return
+                    store.assign(var, value)
+                if method == "mac":
+                    if not self.ac_3(store, assignment, engine=engine): # preprocessing - unary constraints and all arcs once
+                        return
+                elif not all(self.forward_checking_helper(var, store, assignment) for var in assignment):
+                    return
 
+            rng = random.Random(seed) if seed is not None else None
+            # nogoods hold for the whole problem only when they were not learned with restricted domains
+            learning = backjumping and domains is self.domains
+            # restricted domains need not keep values interchangeable
+            symmetries = self.value_symmetries if symmetry != "none" and domains is self.domains else []
+            order = VariableOrder(self, store, variable_heuristic, rng) if variable_bool else None
+            step_limit = self.steps + cutoff if cutoff is not None else None
+            given = dict(assignment) # search below given part of solution keeps its values, so do renamings
+            solutions = self.search(method, order, value_bool, store, assignment, engine, max_depth, rng, backjumping, learning, step_limit,
+                                    symmetries)
+            if len(symmetries) > 0 and symmetry == "expand" and max_depth is None:
+                solutions = (image for solution in solutions for image in self.symmetric_solutions(solution, given))
+            if limit is not None:
+                solutions = islice(solutions, limit)
+            yield from solutions
+        finally:
+            if stats is not None:
+                stats.unwatch()
+
+    # compiled tables know only values of domains they were compiled with (integer_csp - domains of CSP)
+    def check_table_domains(self, domains) -> None:
+        for var, values in domains.items():
+            for constr in self.constraints.get(var, ()):
+                if isinstance(constr, TableConstraint) and any(val not in constr.index[var] for val in values):
+                    raise ValueError("Domain of " + str(var) + " has values unknown to compiled constraints")
+
+    # depth-first search with explicit stack instead of recursion
+    # order=None - variables in given order, otherwise chosen by heuristic of order
+    def search(self, method: str, order: Optional[VariableOrder[V, D]], value_bool: bool, domains: DomainStore[V, D], assignment: Dict[V, D], engine: str,
+               max_depth: Optional[int] = None, rng: Optional[random.Random] = None, backjumping: bool = False,
+               learning: bool = False, step_limit: Optional[int] = None,
+               symmetries: Optional[List[ValueSymmetry[V, D]]] = None) -> Iterator[Dict[V, D]]:
+        # frames: [variable, values, index of next value, trail mark, position in variables,
+        #          conflict set, solution found below]
+        stack: List[list] = []
+        depth: Dict[V, int] = {} # position of variable's frame in stack (backjumping)
+        position = 0 # without variable heuristic variables before position are assigned
+        stats = self.stats
+        states: Optional[Dict[Constraint[V, D], object]] = None # of incremental constraints (backtracking)
+        incremental: Dict[V, List[Constraint[V, D]]] = {} # incremental constraints of variable, only those with any
+        if method == "backtracking":
+            states = self.incremental_states(assignment) or None
+            if states is not None:
+                incremental = {var: [constr for constr in self.constraints[var] if constr in states] for var in self.variables}
+                incremental = {var: constraints for var, constraints in incremental.items() if constraints}
+        broken: Dict[V, List[Tuple[ValueSymmetry[V, D], Dict[D, int]]]] = {} # symmetries of variable with their used values
+        for symmetry in symmetries or ():
+            used = symmetry.used(assignment)
+            for var in symmetry.variables:
+                broken.setdefault(var, []).append((symmetry, used))
+        while True:
+            # all variables are assigned (or all up to max_depth)
+            if len(assignment) == len(self.variables) or len(stack) == max_depth:
+                yield assignment.copy()
+                for frame in stack: # jumping over solutions would lose them
+                    frame[6] = True
             else:
-                result: Optional[List[Dict[V, D]]] = self.forward_checking(variable_bool, value_bool, single_bool, dom, local_assignment)
+                if stats is not None:
+                    started = perf_counter()
+                # VARIABLE
+                if order is not None:
+                    first: V = order.select(assignment)
+                else:
+                    while self.variables[position] in assignment:
+                        position += 1
+                    first: V = self.variables[position]
+
+                # VALUE
+                values = list(domains[first])
+                if value_bool:
+                    values = self.least_constraining_value_heuristic(first, domains, assignment, rng)
+                elif rng is not None:
+                    rng.shuffle(values)
+                for symmetry, used in broken.get(first, ()):
+                    values = symmetry.restrict(used, values)
+                if backjumping:
+                    depth[first] = len(stack)
+                stack.append([first, values, 0, domains.mark(), position, set(), False])
+                if stats is not None:
+                    stats.branching_time += perf_counter() - started
+
+            # next value of the deepest variable, going back when there are no more values
+            while len(stack) > 0:
+                frame = stack[-1]
+                first, values, index, mark, position = frame[:5]
+                if first in assignment: # backtrack - undo removals
+                    for constr in incremental.get(first, ()):
+                        constr.unassign(states[constr], first, assignment[first])
+                    for symmetry, used in broken.get(first, ()):
+                        if assignment[first] in symmetry.members:
+                            used[assignment[first]] -= 1
+                    if stats is not None:
+                        stats.exit(first, len(stack))
+                    if order is not None:
+                        order.changed(first, domains.trail[mark:])
+                    domains.undo(mark)
+                    del assignment[first]
+                if index == len(values):
+                    stack.pop()
+                    if order is not None:
+                        order.released(first)
+                    if backjumping and frame[5] is None: # jumped over
+                        continue
+                    if stats is not None:
+                        stats.backtracks += 1
+                    if backjumping and not self.backjump(frame, stack, depth, assignment, learning):
+                        return
+                    continue
+                if step_limit is not None and self.steps >= step_limit: # cutoff reached
+                    self.interrupted = True
+                    return
+                frame[2] += 1
+                value = values[index]
+                assignment[first] = value
+                for symmetry, used in broken.get(first, ()):
+                    if value in symmetry.members:
+                        used[value] = used.get(value, 0) + 1
+                self.steps += 1
+                self.failed = None
+                if stats is not None:
+                    stats.enter(first, value, len(stack))
+                    started = perf_counter()
 
-                # add new solution to results
-                if result is not None:
-                    if single_bool:
-                        return result
+                if method == "backtracking":
+                    conflict = self.find_conflict(first, assignment, states)
+                    if backjumping and conflict is not None: # assigned variables responsible for failure
+                        frame[5].update(var for var in conflict if var != first and var in assignment)
+                    consistent = conflict is None
+                    for constr in incremental.get(first, ()): # taken back with first
+                        constr.assign(states[constr], first, value)
+                else:
+                    domains.assign(first, value)
+                    assigned = domains.mark()
+                    if method == "mac":
+                        consistent = self.ac_3(domains, assignment, first, engine)
                     else:
-                        results.extend(result)
-        if single_bool:
-            return None
-        if results is not None and len(results) != 0:
-            return results
-        else:
-            return None
+                        consistent = self.forward_checking_helper(first, domains, assignment)
+                    if stats is not None:
+                        stats.pruned += domains.mark() - assigned
+                if stats is not None:
+                    stats.propagation_time += perf_counter() - started
+                    if not consistent:
+                        stats.failures += 1
+                if consistent: # go deeper, otherwise next value
+                    if order is not None:
+                        order.changed(first, domains.trail[mark:])
+                    break
+                if order is not None and self.failed is not None:
+                    order.failed(self.failed)
+            else: # whole tree searched
+                return
 
-    def forward_checking_helper(self, variable: V, domains: Dict[V, List[D]], assignment: Dict[V, D]):
-        neighbours = []
-        for constr in self.constraints[variable]:
-            if len(constr.variables) > 1:
-                multi = list(permutations(constr.variables, 2)) # list of pairs of variables in constraint
-                for arc in multi: # adding arcs
-                    if arc[0] == variable and arc[1] not in assignment.keys():
-                        new_arc = Arc(arc[0], arc[1], constr)
-                        neighbours.append(new_arc)
-            else: # checking unary constraint
-                local_assignment = {variable: assignment[variable]}
-                if not constr.satisfied(local_assignment):
-                    return False
+    # conflict-directed backjumping from exhausted frame to deepest variable in its conflict set
+    # returns False when no variable of the stack can be changed to avoid the conflict
+    # frames jumped over get no more values and no conflict set, search takes them back
+    def backjump(self, frame: list, stack: List[list], depth: Dict[V, int], assignment: Dict[V, D], learning: bool) -> bool:
+        first, conflicts, solved = frame[0], frame[5], frame[6]
+        del depth[first]
+        if solved: # chronological backtracking, solutions were found below
+            if len(stack) > 0:
+                stack[-1][5].update(conflicts)
+            return True
+        if learning and len(conflicts) > 0: # no value of first fits to assignment of conflict set
+            self.nogoods.add({var: assignment[var] for var in conflicts})
+        target = max((depth[var] for var in conflicts if var in depth), default=-1)
+        if target < 0: # only given assignment is responsible
+            return False
+        for skipped in stack[target + 1:]: # frames jumped over
+            skipped[2] = len(skipped[1])
+            skipped[5] = None
+            del depth[skipped[0]]
+        stack[target][5].update(var for var in conflicts if var != stack[target][0])
+        return True
+
+    def forward_checking_helper(self, variable: V, domains: Union[Dict[V, List[D]], DomainStore[V, D]], assignment: Dict[V, D]):
+        if not isinstance(domains, DomainStore): # removals go straight to given domains
+            domains = DomainStore(domains)
+        for constr in self.unary[variable]: # checking unary constraints
+            local_assignment = {variable: assignment[variable]}
+            if not constr.satisfied(local_assignment):
+                return self.fail(constr)
+        neighbours = [arc for arc in self.arcs_from[variable] if arc.end not in assignment]
 
         new_assignment = {variable: assignment[variable]} # assignment only with variable + neighbour later
         for neighbour in neighbours: # neighbour = arc
-            local_domain = copy.deepcopy(domains)
-            for val_nei in domains[neighbour.end]: # possible values for neighbour
+            if isinstance(neighbour.const, TableConstraint):
+                if not self.remove_unsupported_values(neighbour.const, neighbour.end, [assignment[variable]], domains):
+                    return self.fail(neighbour.const)
+                continue
+            for val_nei in list(domains[neighbour.end]): # possible values for neighbour
                 new_assignment[neighbour.end] = val_nei
                 if not neighbour.const.satisfied(new_assignment): # delete from domain if not satisfies
-                    local_domain[neighbour.end].remove(val_nei)
-            if len(local_domain[neighbour.end]) == 0:
-                return False
-            if len(local_domain[neighbour.end]) != len(domains[neighbour.end]):
-                domains[neighbour.end] = local_domain[neighbour.end]
+                    domains.remove(neighbour.end, val_nei)
+            if len(domains[neighbour.end]) == 0:
+                return self.fail(neighbour.const)
             del new_assignment[neighbour.end]
 
+        for constr in self.global_constraints[variable]:
+            if not constr.propagate(domains):
+                return self.fail(constr)
+
         return True
 
-    def ac_3(self, domains, assignment) -> bool:
+    def apply_unary_constraints(self, domains: DomainStore[V, D]) -> bool:
+        for var, unary in self.unary.items():
+            for con in unary:
+                for val in list(domains[var]):
+                    local_assignment = {var: val}
+                    if not con.satisfied(local_assignment):
+                        domains.remove(var, val) # removing values not satisfying unary constraint
+                if len(domains[var]) == 0:
+                    return self.fail(con)
+            if len(domains[var]) == 0: # empty from the start
+                return False
+        return True
 
-        unary = []
-        arcs = set()
-        queue = set()
+    # variable=None - all arcs and unary constraints, otherwise only arcs pointing into just assigned variable
+    # engine: "ac3" - rescan neighbour domain, "ac2001" - resume from last found support
+    def ac_3(self, domains: Union[Dict[V, List[D]], DomainStore[V, D]], assignment, variable: Optional[V] = None, engine: str = "ac3") -> bool:
+        if not isinstance(domains, DomainStore): # removals go straight to given domains
+            domains = DomainStore(domains)
+        if engine == "ac3":
+            revise = self.remove_inconsistent_values
+        elif engine == "ac2001":
+            revise = self.remove_inconsistent_values_residue
+        else:
+            raise ValueError("Unknown propagation engine: " + str(engine))
 
-        for var, constraints in self.constraints.items():
-            for constr in constraints:
-                if len(constr.variables) > 1:
-                    multi = list(permutations(constr.variables, 2)) # list of pairs of variables in constraint
-                    for arc in multi: # adding arcs
-                        new = Arc(arc[0], arc[1], constr)
-                        arcs.add(new)
-                        queue.add(new)
-                else:
-                    unary.append(constr)
+        if variable is None:
+            if not self.apply_unary_constraints(domains):
+                return False
+            queue = deque(self.arcs)
+            pending = deque(dict.fromkeys(constr for constraints in self.global_constraints.values() for constr in constraints))
+        else:
+            queue = deque(self.arcs_to[variable])
+            pending = deque(self.global_constraints[variable])
+        in_queue = set(queue)
+        in_pending = set(pending)
+        stats = self.stats
 
-        for con in unary:
-            new_domain = []
-            var = con.variables[0]
-            for val in domains[var]:
-                local_assignment = {var: val}
-                if con.satisfied(local_assignment):
-                    new_domain.append(val)
-            domains[var] = new_domain # setting new domains for unary constraints
+        while len(queue) > 0 or len(pending) > 0:
+            if len(queue) == 0: # arcs are consistent - filtering global constraints
+                constr = pending.popleft()
+                in_pending.remove(constr)
+                mark = domains.mark()
+                if not constr.propagate(domains):
+                    return self.fail(constr)
+                for var in dict.fromkeys(var for var, _, _ in domains.trail[mark:]): # changed variables
+                    for arc in self.arcs_to[var]:
+                        if arc not in in_queue:
+                            queue.append(arc)
+                            in_queue.add(arc)
+                    for other in self.global_constraints[var]:
+                        if other is not constr and other not in in_pending:
+                            pending.append(other)
+                            in_pending.add(other)
+                continue
 
-        while len(queue) > 0:
-            actual_arc = list(queue)[0] # dequeue
-            queue.remove(actual_arc)
-            if self.remove_inconsistent_values(actual_arc, domains, assignment): # if removed
+            actual_arc = queue.popleft() # dequeue
+            in_queue.remove(actual_arc)
+            if stats is not None:
+                stats.revisions += 1
+            if isinstance(actual_arc.const, TableConstraint):
+                removed = self.remove_inconsistent_values_table(actual_arc, domains)
+            else:
+                removed = revise(actual_arc, domains, assignment)
+            if removed: # if removed
                 if len(domains[actual_arc.start]) == 0: # no possible values -> failure
-                    return False
-                for arc in arcs:
-                    if arc.start != actual_arc.end and arc.end == actual_arc.start: # adding neghbours to queue
-                        queue.add(arc)
+                    return self.fail(actual_arc.const)
+                for arc in self.arcs_to[actual_arc.start]:
+                    if arc.start != actual_arc.end and arc not in in_queue: # adding neghbours to queue
+                        queue.append(arc)
+                        in_queue.add(arc)
+                for constr in self.global_constraints[actual_arc.start]:
+                    if constr not in in_pending:
+                        pending.append(constr)
+                        in_pending.add(constr)
 
         return True # satisfied
 
-    def remove_inconsistent_values(self, arc: Arc, domains, assignment) -> bool:
+    def remove_inconsistent_values(self, arc: Arc, domains: DomainStore[V, D], assignment) -> bool:
         removed = False
-        for x in domains[arc.start]:
-            local_assignment = assignment.copy()
-            local_assignment[arc.start] = x
+        saved = {var: assignment[var] for var in (arc.start, arc.end) if var in assignment} # assignment is changed in place, restored at the end
+        for x in list(domains[arc.start]):
+            assignment[arc.start] = x
             satisfy = [] # does each value satisfy constraint
             for y in domains[arc.end]:
-                local_assignment[arc.end] = y
-                if arc.const.satisfied(local_assignment):
+                assignment[arc.end] = y
+                if arc.const.satisfied(assignment):
                     satisfy.append(True)
                     break # at least one possible value -> stop checking
                 else:
                     satisfy.append(False)
 
             if not any(satisfy): # all false - not satisfied
-                domains[arc.start].remove(x) # delete value from domain
+                domains.remove(arc.start, x) # delete value from domain
+                removed = True
+
+        for var in (arc.start, arc.end):
+            if var in saved:
+                assignment[var] = saved[var]
+            else:
+                assignment.pop(var, None)
+        return removed
+
+    def remove_inconsistent_values_residue(self, arc: Arc, domains: DomainStore[V, D], assignment) -> bool:
+        removed = False
+        end_values = domains[arc.end]
+        end_set = set(end_values)
+        if arc.end not in self.value_index:
+            self.value_index[arc.end] = {val: i for i, val in enumerate(self.domains[arc.end])}
+        index = self.value_index[arc.end]
+        if all(y in index for y in end_values):
+            positions = [index[y] for y in end_values] # domains keep initial order of values
+        else: # domains given to search with values outside initial ones - scans start from first value
+            positions = None
+        # binary constraint needs only its two variables, n-ary ones see whole assignment (one copy per arc)
+        binary = arc.const.arity == 2
+        local_assignment = {} if binary else assignment.copy()
+
+        for x in list(domains[arc.start]):
+            local_assignment[arc.start] = x
+            residue = self.residues.get((arc, x))
+            start = 0
+            if residue is not None:
+                if residue in end_set:
+                    if binary: # support of binary constraint doesn't change
+                        continue
+                    local_assignment[arc.end] = residue
+                    if arc.const.satisfied(local_assignment):
+                        continue
+                if positions is not None and residue in index:
+                    start = bisect_right(positions, index[residue]) # resume after last support
+
+            supported = False
+            for i in range(len(end_values)): # whole domain, starting from residue
+                y = end_values[(start + i) % len(end_values)]
+                local_assignment[arc.end] = y
+                if arc.const.satisfied(local_assignment):
+                    self.residues[(arc, x)] = y
+                    supported = True
+                    break # at least one possible value -> stop checking
+
+            if not supported:
+                domains.remove(arc.start, x) # delete value from domain
                 removed = True
 
         return removed
 
+    def remove_inconsistent_values_table(self, arc: Arc, domains: DomainStore[V, D]) -> bool:
+        table: TableConstraint[V, D] = arc.const
+        start_values = domains[arc.start]
+        if self.stats is not None: # one support set or row per value
+            self.stats.count(table, len(start_values))
+        if len(table.values[arc.end]) < TABLE_ARRAY_SIZE:
+            removed = False
+            end_values = domains[arc.end]
+            for x in list(start_values):
+                supports = table.supports[arc.start][x]
+                if not any(y in supports for y in end_values):
+                    domains.remove(arc.start, x) # delete value from domain
+                    removed = True
+            return removed
+        rows = table.rows(arc.start)[[table.index[arc.start][x] for x in start_values]]
+        supported = (rows & table.mask(arc.end, domains[arc.end])).any(axis=1) # any support per value
+        if supported.all():
+            return False
+        for x in [x for x, ok in zip(start_values, supported) if not ok]:
+            domains.remove(arc.start, x) # delete value from domain
+        return True
+
+    # removes values of variable not compatible with any of given values of the other variable in table
+    def remove_unsupported_values(self, table: TableConstraint[V, D], variable: V, other_values: List[D], domains: DomainStore[V, D]) -> bool:
+        other = table.var1 if variable == table.var2 else table.var2
+        if self.stats is not None: # one support set or row per value of the other variable
+            self.stats.count(table, len(other_values))
+        if len(table.values[variable]) < TABLE_ARRAY_SIZE:
+            supports = set().union(*(table.supports[other][y] for y in other_values))
+            for x in [x for x in domains[variable] if x not in supports]:
+                domains.remove(variable, x)
+            return len(domains[variable]) > 0
+        rows = table.rows(other)[[table.index[other][y] for y in other_values]]
+        supported = rows.any(axis=0)
+        index = table.index[variable]
+        for x in [x for x in domains[variable] if not supported[index[x]]]:
+            domains.remove(variable, x)
+        return len(domains[variable]) > 0
+
     # VALUE HEURISTIC
-    def least_constraining_value_heuristic(self, variable: V, domains: Dict[V, List[D]], assignment):
-
-        neighbours = []
-        for constr in self.constraints[variable]:
-            if len(constr.variables) > 1:
-                multi = list(permutations(constr.variables, 2)) # list of pairs of variables in constraint
-                for arc in multi: # adding arcs
-                    if arc[1] not in assignment.keys():
-                        new_arc = Arc(arc[0], arc[1], constr)
-                        neighbours.append(new_arc)
-
-        values = {}
-        for val in domains[variable]: # possible values for variable
-            values[val] = 0 # adding to dict
-            new_assignment = assignment.copy()
-            new_assignment[variable] = val
-            for neighbour in neighbours: # neighbour = arc
-                for val_nei in domains[neighbour.end]: # possible values for neighbour
-                    new_assignment[neighbour.end] = val_nei
-                    if neighbour.const.satisfied(new_assignment):
+    # rng - random order of values with the same score
+    def least_constraining_value_heuristic(self, variable: V, domains: Union[Dict[V, List[D]], DomainStore[V, D]], assignment, rng: Optional[random.Random] = None):
+
+        neighbours = [arc for arc in self.arcs_from[variable] if arc.end not in assignment]
+        candidates = list(domains[variable])
+        if rng is not None:
+            rng.shuffle(candidates)
+
+        values = {val: 0 for val in candidates}
+        for neighbour in neighbours: # neighbour = arc
+            end_values = domains[neighbour.end]
+            if neighbour.const.arity == 2:
+                supports, known = self.binary_supports(neighbour.const, variable)
+                if known.issuperset(end_values):
+                    end_set = set(end_values)
+                    for val in candidates: # count possible values of neighbour
+                        if val not in supports:
+                            supports[val] = {y for y in known if neighbour.const.satisfied({variable: val, neighbour.end: y})}
+                        values[val] += len(end_set.intersection(supports[val]))
+                    continue
+            for val in candidates: # possible values for variable, assignment is changed in place and cleaned at the end
+                assignment[variable] = val
+                for val_nei in end_values: # possible values for neighbour
+                    assignment[neighbour.end] = val_nei
+                    if neighbour.const.satisfied(assignment):
                         values[val] += 1 # count possible values (for all neighbours per each variable value)
-                del new_assignment[neighbour.end]
+            assignment.pop(variable, None)
+            assignment.pop(neighbour.end, None)
+        for constr in self.global_constraints[variable]: # values of other unassigned variables different from val
+            for other in constr.variables:
+                if other != variable and other not in assignment:
+                    for val in candidates:
+                        values[val] += len(domains[other]) - (1 if val in domains[other] else 0)
 
         return [k for k, v in sorted(values.items(), key=lambda item: item[1], reverse=True)] # list in correct order (most possibilities first)
 
+    # compatible values of the other variable for values of variable and initial domain of the other variable
+    # supports are filled on first use, compiled tables have them all
+    def binary_supports(self, constraint: Constraint[V, D], variable: V) -> Tuple[Dict[D, Set[D]], Set[D]]:
+        key = (constraint, variable)
+        if key not in self.supports:
+            other = constraint.variables[1] if constraint.variables[0] == variable else constraint.variables[0]
+            if isinstance(constraint, TableConstraint):
+                self.supports[key] = (constraint.supports[variable], set(constraint.values[other]))
+            else:
+                self.supports[key] = ({}, set(self.domains[other]))
+        return self.supports[key]
+
     # VARIABLE HEURISTIC
-    def minimum_remaining_values_heuristic(self, variables: List[V], domains: Dict[V, List[D]]):
+    def minimum_remaining_values_heuristic(self, variables: List[V], domains: Union[Dict[V, List[D]], DomainStore[V, D]]):
         domains_length = {}
         for var in variables:
             domains_length[var] = len(domains[var])
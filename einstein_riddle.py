@@ -1,23 +1,15 @@
 from typing import List, Dict, Optional
 import time
-from csp import CSP, Constraint
+from csp import CSP, Constraint, AllDifferent
+from model_cache import cached_model, model_key
 
 
-# unique values in category
-class AllDifferentConstraint(Constraint[str, int]):
+# unique values in category (global constraint)
+class AllDifferentConstraint(AllDifferent[str, int]):
     def __init__(self, category: List[str]) -> None:
         super().__init__([var for var in category])
         self.category: List[str] = category
 
-    def satisfied(self, assignment: Dict[str, int]) -> bool:
-        vals = [] # taken values in category
-        for key, value in assignment.items():
-            if key in self.category:
-                if value in vals: # if it repeats
-                    return False
-                vals.append(value)
-        return True
-
 
 # particular value (house number) to variable
 class HouseNumberConstraint(Constraint[str, int]):
@@ -62,42 +54,53 @@ class NeighbourConstraint(Constraint[str, int]):
         return True # if one is not in assignment
 
 
-if __name__ == "__main__":
-
-    nationality = ["Norweg", "Anglik", "Dunczyk", "Niemiec", "Szwed"]
-    color = ["Czerwony", "Bialy", "Zolty", "Niebieski", "Zielony"]
-    cigarette = ["Light", "Cygaro", "Fajka", "Bez_filtra", "Mentolowe"]
-    drink = ["Herbata", "Mleko", "Woda", "Piwo", "Kawa"]
-    pet = ["Kot", "Ptak", "Pies", "Kon", "Rybki"]
+CATEGORIES: List[List[str]] = [
+    ["Norweg", "Anglik", "Dunczyk", "Niemiec", "Szwed"], # nationality
+    ["Czerwony", "Bialy", "Zolty", "Niebieski", "Zielony"], # color
+    ["Light", "Cygaro", "Fajka", "Bez_filtra", "Mentolowe"], # cigarette
+    ["Herbata", "Mleko", "Woda", "Piwo", "Kawa"], # drink
+    ["Kot", "Ptak", "Pies", "Kon", "Rybki"]] # pet
 
-    variables: List[str] = nationality + color + cigarette + drink + pet
+# riddle with first `clues` clues (all 15 by default) - fewer clues, more solutions
+def einstein_csp(clues: Optional[int] = None) -> CSP[str, int]:
+    variables: List[str] = [var for category in CATEGORIES for var in category]
     domains: Dict[str, List[int]] = {}
     for variable in variables:
         domains[variable] = [1, 2, 3, 4, 5]
 
     csp: CSP[str, int] = CSP(variables, domains)
+    for category in CATEGORIES:
+        csp.add_constraint(AllDifferentConstraint(category))
+
+    hints: List[Constraint[str, int]] = [
+        HouseNumberConstraint("Norweg", 1),
+        SameHouseNumberConstraint("Anglik", "Czerwony"),
+        NeighbourConstraint("Zielony", "Bialy", "left"),
+        SameHouseNumberConstraint("Dunczyk", "Herbata"),
+        NeighbourConstraint("Light", "Kot", "?"),
+        SameHouseNumberConstraint("Zolty", "Cygaro"),
+        SameHouseNumberConstraint("Niemiec", "Fajka"),
+        HouseNumberConstraint("Mleko", 3),
+        NeighbourConstraint("Light", "Woda", "?"),
+        SameHouseNumberConstraint("Bez_filtra", "Ptak"),
+        SameHouseNumberConstraint("Szwed", "Pies"),
+        NeighbourConstraint("Norweg", "Niebieski", "?"),
+        NeighbourConstraint("Kon", "Zolty", "?"),
+        SameHouseNumberConstraint("Mentolowe", "Piwo"),
+        SameHouseNumberConstraint("Zielony", "Kawa")]
+    for hint in hints[:clues]:
+        csp.add_constraint(hint)
+    return csp
+
+
+# einstein_csp stored in model cache directory, loaded from it when it was built before
+def cached_einstein_csp(directory: str, clues: Optional[int] = None) -> CSP[str, int]:
+    return cached_model(model_key("einstein riddle", clues, sources=(einstein_csp, CSP)), lambda: einstein_csp(clues), directory)
+
 
-    csp.add_constraint(AllDifferentConstraint(nationality))
-    csp.add_constraint(AllDifferentConstraint(color))
-    csp.add_constraint(AllDifferentConstraint(cigarette))
-    csp.add_constraint(AllDifferentConstraint(drink))
-    csp.add_constraint(AllDifferentConstraint(pet))
-
-    csp.add_constraint(HouseNumberConstraint("Norweg", 1))
-    csp.add_constraint(SameHouseNumberConstraint("Anglik", "Czerwony"))
-    csp.add_constraint(NeighbourConstraint("Zielony", "Bialy", "left"))
-    csp.add_constraint(SameHouseNumberConstraint("Dunczyk", "Herbata"))
-    csp.add_constraint(NeighbourConstraint("Light", "Kot", "?"))
-    csp.add_constraint(SameHouseNumberConstraint("Zolty", "Cygaro"))
-    csp.add_constraint(SameHouseNumberConstraint("Niemiec", "Fajka"))
-    csp.add_constraint(HouseNumberConstraint("Mleko", 3))
-    csp.add_constraint(NeighbourConstraint("Light", "Woda", "?"))
-    csp.add_constraint(SameHouseNumberConstraint("Bez_filtra", "Ptak"))
-    csp.add_constraint(SameHouseNumberConstraint("Szwed", "Pies"))
-    csp.add_constraint(NeighbourConstraint("Norweg", "Niebieski", "?"))
-    csp.add_constraint(NeighbourConstraint("Kon", "Zolty", "?"))
-    csp.add_constraint(SameHouseNumberConstraint("Mentolowe", "Piwo"))
-    csp.add_constraint(SameHouseNumberConstraint("Zielony", "Kawa"))
+if __name__ == "__main__":
+    csp: CSP[str, int] = einstein_csp()
+    #csp: CSP[str, int] = cached_einstein_csp(".model_cache")
 
     start_time = time.time()
     solution: Optional[List[Dict[str, int]]] = csp.backtracking_search(True, True, False)
@@ -0,0 +1,138 @@
+from typing import Generic, Dict, List, Optional, Tuple
+import random
+import time
+from csp import CSP, Constraint, V, D
+
+
+# min-conflicts local search - complete assignment repaired by changing values of variables in violated constraints
+# conflicts of variables are updated after each move only for constraints of moved variable
+class MinConflicts(Generic[V, D]):
+
+    def __init__(self, csp: CSP[V, D], seed: Optional[int] = 0, tabu_tenure: int = 10, walk_probability: float = 0.02) -> None:
+        self.csp: CSP[V, D] = csp
+        self.rng = random.Random(seed)
+        self.tabu_tenure = tabu_tenure # steps before variable may take back its previous value
+        self.walk_probability = walk_probability # chance of random value instead of best one
+        self.constraints: List[Constraint[V, D]] = list(dict.fromkeys(constr for var in csp.variables for constr in csp.constraints[var]))
+        self.assignment: Dict[V, D] = {}
+        self.violated: Dict[Constraint[V, D], bool] = {}
+        self.conflicts: Dict[V, int] = {} # violated constraints of variable
+        self.conflicted: List[V] = [] # variables with conflicts, swap-removed
+        self.position: Dict[V, int] = {} # index in conflicted
+        self.total = 0 # violated constraints
+        self.tabu: Dict[Tuple[V, D], int] = {} # (variable, value) -> first step when it is allowed again
+
+    # greedy start - every variable gets value with fewest conflicts with variables before it
+    def initialize(self, assignment: Optional[Dict[V, D]] = None) -> None:
+        self.tabu = {} # steps of previous solve mean nothing now
+        self.assignment = {} if assignment is None else dict(assignment)
+        for var in self.csp.variables:
+            if var not in self.assignment:
+                self.assignment[var] = self.best_value(var, 0)[0]
+        self.violated = {constr: not constr.satisfied(self.assignment) for constr in self.constraints}
+        self.conflicts = {var: 0 for var in self.csp.variables}
+        self.conflicted = []
+        self.position = {}
+        self.total = 0
+        for constr, violated in self.violated.items():
+            if violated:
+                self.total += 1
+                for var in constr.variables:
+                    self.add_conflicts(var, 1)
+
+    def add_conflicts(self, variable: V, change: int) -> None:
+        before = self.conflicts[variable]
+        self.conflicts[variable] = before + change
+        if before == 0 and change > 0:
+            self.position[variable] = len(self.conflicted)
+            self.conflicted.append(variable)
+        elif before + change == 0:
+            index = self.position.pop(variable)
+            last = self.conflicted.pop()
+            if last != variable:
+                self.conflicted[index] = last
+                self.position[last] = index
+
+    # violated constraints of variable if it had value
+    def count(self, variable: V, value: D) -> int:
+        assigned = variable in self.assignment
+        saved = self.assignment.get(variable)
+        self.assignment[variable] = value
+        violated = sum(1 for constr in self.csp.constraints[variable] if not constr.satisfied(self.assignment))
+        if assigned:
+            self.assignment[variable] = saved
+        else:
+            del self.assignment[variable]
+        return violated
+
+    # value with fewest violated constraints (random among ties) and their count
+    # values tabu at step are skipped unless they give fewer violations than best total (aspiration)
+    def best_value(self, variable: V, step: int, best_total: Optional[int] = None) -> Tuple[D, int]:
+        current = self.count(variable, self.assignment[variable]) if variable in self.assignment else 0
+        best: List[D] = []
+        fewest = None
+        for value in self.csp.domains[variable]:
+            violated = self.count(variable, value)
+            if self.tabu.get((variable, value), 0) > step:
+                if best_total is None or self.total - current + violated >= best_total:
+                    continue
+            if fewest is None or violated < fewest:
+                best = [value]
+                fewest = violated
+            elif violated == fewest:
+                best.append(value)
+        if len(best) == 0: # all values tabu - keep the current one
+            return self.assignment[variable], current
+        return self.rng.choice(best), fewest
+
+    def move(self, variable: V, value: D, step: int) -> None:
+        old = self.assignment[variable]
+        self.assignment[variable] = value
+        if self.tabu_tenure > 0:
+            self.tabu[(variable, old)] = step + self.tabu_tenure
+        for constr in self.csp.constraints[variable]:
+            violated = not constr.satisfied(self.assignment)
+            if violated != self.violated[constr]:
+                self.violated[constr] = violated
+                change = 1 if violated else -1
+                self.total += change
+                for var in constr.variables:
+                    self.add_conflicts(var, change)
+
+    # best assignment found within budget and number of its violated constraints (0 - solution)
+    # max_steps - number of moves, time_limit - seconds, at least one of them is needed (unsatisfiable problems never end)
+    def solve(self, max_steps: Optional[int] = 100000, time_limit: Optional[float] = None,
+              assignment: Optional[Dict[V, D]] = None) -> Tuple[Dict[V, D], int]:
+        if max_steps is None and time_limit is None:
+            raise ValueError("Local search needs max_steps or time_limit")
+        start = time.time()
+        self.initialize(assignment)
+        best_total = self.total
+        since_best: List[Tuple[V, D]] = [] # (variable, previous value) of moves after best assignment
+        step = 0
+        while self.total > 0 and (max_steps is None or step < max_steps):
+            if time_limit is not None and step % 256 == 0 and time.time() - start > time_limit:
+                break
+            variable = self.rng.choice(self.conflicted)
+            if self.walk_probability > 0 and self.rng.random() < self.walk_probability:
+                value = self.rng.choice(self.csp.domains[variable])
+            else:
+                value = self.best_value(variable, step, best_total)[0]
+            step += 1
+            self.csp.steps += 1
+            if value == self.assignment[variable]:
+                continue
+            since_best.append((variable, self.assignment[variable]))
+            self.move(variable, value, step)
+            if self.total < best_total:
+                best_total = self.total
+                since_best = []
+        best = dict(self.assignment)
+        for variable, value in reversed(since_best): # back to best assignment
+            best[variable] = value
+        return best, best_total
+
+
+def min_conflicts(csp: CSP[V, D], max_steps: Optional[int] = 100000, time_limit: Optional[float] = None, seed: Optional[int] = 0,
+                  tabu_tenure: int = 10, walk_probability: float = 0.02) -> Tuple[Dict[V, D], int]:
+    return MinConflicts(csp, seed, tabu_tenure, walk_probability).solve(max_steps, time_limit)
@@ -1,7 +1,9 @@
 import time
 from typing import Dict, List, Optional
 from Board import Board
+from Point import Point
 from csp import Constraint, CSP
+from model_cache import cached_model, model_key
 
 
 class MapColoringConstraint(Constraint[str, str]):
@@ -16,19 +18,41 @@ class MapColoringConstraint(Constraint[str, str]):
         return assignment[self.point1] != assignment[self.point2]
 
 
-if __name__ == "__main__":
-    board = Board(30, 30)
-    board.make_points(5)
-    board.make_links()
+COLORS: List[str] = ["red", "green", "blue", "pink", "yellow", "cyan", "orange", "purple"]
+
 
+# regions are points of board, linked points need different colors
+def map_coloring_csp(board: Board, colors: List[str] = COLORS[:4]) -> CSP[str, str]:
     variables: List[str] = board.points
     domains: Dict[str, List[str]] = {}
     for variable in variables:
-        domains[variable] = ["red", "green", "blue", "pink"]
+        domains[variable] = list(colors)
     csp: CSP[str, str] = CSP(variables, domains)
 
     for link in board.links:
         csp.add_constraint(MapColoringConstraint(link[0], link[1]))
+    csp.add_value_symmetry(colors) # any renaming of colors keeps coloring valid
+    return csp
+
+
+# board with n random points, links to k nearest points (all points if None)
+def random_board(width: int, height: int, n: int, seed: int = 15, k: Optional[int] = None) -> Board:
+    board = Board(width, height)
+    board.make_points(n, seed)
+    board.make_links(k)
+    return board
+
+
+# map_coloring_csp of random_board stored in model cache directory, loaded from it when the same one was built before
+def cached_map_coloring_csp(directory: str, width: int, height: int, n: int, seed: int = 15, k: Optional[int] = None,
+                            colors: List[str] = COLORS[:4]) -> CSP[str, str]:
+    key = model_key("map coloring", width, height, n, seed, k, list(colors), sources=(map_coloring_csp, Board, Point, CSP))
+    return cached_model(key, lambda: map_coloring_csp(random_board(width, height, n, seed, k), colors), directory)
+
+
+if __name__ == "__main__":
+    csp: CSP[str, str] = map_coloring_csp(random_board(30, 30, 5))
+    #csp: CSP[str, str] = cached_map_coloring_csp(".model_cache", 30, 30, 5)
 
     start_time = time.time()
     #solution: Optional[List[Dict[str, str]]] = csp.backtracking_search(False, True, True)
@@ -40,6 +64,6 @@ if __name__ == "__main__":
         print("--- %s seconds ---" % (time.time() - start_time))
         print("Steps:", csp.steps)
         #print("SOLUTIONS AMOUNT:", len(solution))
-        #board.draw_board(solution)
+        #random_board(30, 30, 5).draw_board(solution)
         # for s in solution:
-        #     board.draw_board(s)
+        #     random_board(30, 30, 5).draw_board(s)
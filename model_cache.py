@@ -0,0 +1,146 @@
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from csp import CSP, AllDifferent, Constraint, TableConstraint, V, D
+
+MODEL_FORMAT = 2 # stored models of other formats are not found
+
+
+# binary constraint of loaded model - compatible values are known only from stored table over all values
+class StoredConstraint(Constraint[V, D]):
+
+    def __init__(self, variables: List[V], value_ids: Dict[D, int], table: np.ndarray, kind: str) -> None:
+        super().__init__(variables)
+        self.value_ids = value_ids
+        self.table = table
+        self.stored_kind = kind # class of constraint the model was built with
+
+    def satisfied(self, assignment: Dict[V, D]) -> bool:
+        var1, var2 = self.variables
+        if var1 not in assignment or var2 not in assignment:
+            return True
+        return bool(self.table[self.value_ids[assignment[var1]], self.value_ids[assignment[var2]]])
+
+    def kind(self) -> str:
+        return self.stored_kind
+
+
+# content hash of everything the model is built from - parts (e.g. name of instance family and its parameters)
+# and source files of modules defining sources (builders and constraint classes), edited code gives other key
+def model_key(*parts, sources: Tuple = ()) -> str:
+    digest = hashlib.sha256(repr((MODEL_FORMAT,) + parts).encode())
+    for path in sorted({os.path.abspath(sys.modules[source.__module__].__file__) for source in sources}):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# integer ids of values in order of first use, flattened lists of ids with start of each list (n + 1 offsets)
+def flatten(lists: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ids) for ids in lists])
+    flat = np.array([i for ids in lists for i in ids], dtype=np.int32)
+    return flat, offsets
+
+
+# writes model to directory: variables and values (pickled, ids are their positions) and numpy arrays over ids -
+# domains, binary constraints with their distinct tables over all values, scopes of AllDifferent constraints
+# unary constraints are applied to stored domains, other constraints with arity > 2 cannot be stored
+def save_model(csp: CSP[V, D], directory: str) -> None:
+    constraints = list(dict.fromkeys([arc.const for arc in csp.arcs] + [constr for var in csp.variables for constr in csp.constraints[var]]))
+    for constr in constraints:
+        if constr.arity > 2 and not isinstance(constr, AllDifferent):
+            raise ValueError("Only unary, binary and AllDifferent constraints can be stored.")
+    domains = {var: [val for val in csp.domains[var] if all(constr.satisfied({var: val}) for constr in csp.unary[var])] for var in csp.variables}
+    ids = {var: i for i, var in enumerate(csp.variables)}
+    values = list(dict.fromkeys(val for var in csp.variables for val in domains[var]))
+    value_ids = {val: i for i, val in enumerate(values)}
+
+    tables: Dict[bytes, int] = {} # equal tables are stored once
+    stacked: List[np.ndarray] = []
+    binary: List[Tuple[int, int, int]] = [] # (first variable, second variable, table)
+    kinds: List[str] = [] # class names of binary constraints
+    for constr in constraints:
+        if constr.arity != 2 or isinstance(constr, AllDifferent):
+            continue
+        var1, var2 = constr.variables
+        table = np.zeros((len(values), len(values)), dtype=bool)
+        for val1 in domains[var1]:
+            for val2 in domains[var2]:
+                table[value_ids[val1], value_ids[val2]] = constr.satisfied({var1: val1, var2: val2})
+        key = table.tobytes()
+        if key not in tables:
+            tables[key] = len(stacked)
+            stacked.append(table)
+        binary.append((ids[var1], ids[var2], tables[key]))
+        kinds.append(constr.kind())
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "names.pkl"), "wb") as file:
+        symmetries = [([value_ids[val] for val in symmetry.values if val in value_ids], [ids[var] for var in symmetry.variables])
+                      for symmetry in csp.value_symmetries]
+        pickle.dump({"variables": csp.variables, "values": values, "symmetries": symmetries, "kinds": kinds}, file, pickle.HIGHEST_PROTOCOL)
+    domain_ids, domain_offsets = flatten([[value_ids[val] for val in domains[var]] for var in csp.variables])
+    np.save(os.path.join(directory, "domain_ids.npy"), domain_ids)
+    np.save(os.path.join(directory, "domain_offsets.npy"), domain_offsets)
+    np.save(os.path.join(directory, "tables.npy"), np.array(stacked, dtype=bool).reshape(len(stacked), len(values), len(values)))
+    np.save(os.path.join(directory, "binary.npy"), np.array(binary, dtype=np.int32).reshape(len(binary), 3))
+    scopes = [[ids[var] for var in constr.variables] for constr in constraints if isinstance(constr, AllDifferent)]
+    scope_ids, scope_offsets = flatten(scopes)
+    np.save(os.path.join(directory, "scope_ids.npy"), scope_ids)
+    np.save(os.path.join(directory, "scope_offsets.npy"), scope_offsets)
+
+
+# csp from directory written by save_model, arrays are memory-mapped (tables over all values are used without copying)
+def load_model(directory: str, mmap: bool = True) -> CSP:
+    def array(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None)
+
+    with open(os.path.join(directory, "names.pkl"), "rb") as file:
+        names = pickle.load(file)
+    variables, values = names["variables"], names["values"]
+    domain_ids, domain_offsets = array("domain_ids"), array("domain_offsets")
+    domain_lists = [domain_ids[domain_offsets[i]:domain_offsets[i + 1]].tolist() for i in range(len(variables))]
+    csp = CSP(list(variables), {var: [values[j] for j in ids] for var, ids in zip(variables, domain_lists)})
+
+    tables = array("tables")
+    value_ids = {val: i for i, val in enumerate(values)}
+    full = list(range(len(values)))
+    compiled: Dict[Tuple[int, tuple, tuple], TableConstraint] = {} # first constraint with table and domains, others are its renamings
+    for (i, j, t), kind in zip(array("binary").tolist(), names["kinds"]):
+        stored = StoredConstraint([variables[i], variables[j]], value_ids, np.asarray(tables[t]), kind) # view of mapped file
+        key = (t, tuple(domain_lists[i]), tuple(domain_lists[j]))
+        if key in compiled:
+            csp.add_constraint(compiled[key].renamed(stored))
+            continue
+        if domain_lists[i] == full and domain_lists[j] == full:
+            table = stored.table
+        else:
+            table = np.asarray(tables[t][np.ix_(domain_lists[i], domain_lists[j])])
+        compiled[key] = TableConstraint(stored, csp.domains, table)
+        csp.add_constraint(compiled[key])
+    scope_ids, scope_offsets = array("scope_ids"), array("scope_offsets")
+    for k in range(len(scope_offsets) - 1):
+        csp.add_constraint(AllDifferent([variables[i] for i in scope_ids[scope_offsets[k]:scope_offsets[k + 1]].tolist()]))
+    for value_list, variable_list in names["symmetries"]:
+        csp.add_value_symmetry([values[j] for j in value_list], [variables[i] for i in variable_list])
+    return csp
+
+
+# model stored under key in directory, built and stored first when missing - always the loaded model,
+# so the first run searches the same constraints as the next ones
+# other processes may store the same model at the same time - the first one stays
+def cached_model(key: str, build: Callable[[], CSP], directory: str) -> CSP:
+    path = os.path.join(directory, key)
+    if not os.path.exists(os.path.join(path, "names.pkl")):
+        temporary = path + ".%d.tmp" % os.getpid()
+        save_model(build(), temporary)
+        try:
+            os.replace(temporary, path)
+        except OSError: # stored by another process meanwhile
+            shutil.rmtree(temporary, ignore_errors=True)
+    return load_model(path)
@@ -0,0 +1,176 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import Process, Queue
+from queue import Empty
+from typing import Dict, List, Optional, Tuple, Union
+import os
+from csp import CSP, merge_solutions
+
+# (method, variable_bool, value_bool) of every solver
+CONFIGURATIONS: List[Tuple[str, bool, bool]] = list(product(["mac", "forward_checking", "backtracking"], [True, False], [False, True]))
+
+worker_csp: Optional[CSP] = None # problem copy in each worker process
+
+
+def init_worker(csp: CSP) -> None:
+    global worker_csp
+    worker_csp = csp
+
+
+# solves one subproblem - search below given partial assignment
+# only solutions not renamed by value symmetries - renamings may change values of prefix, so they are left to caller
+def solve_subproblem(args) -> Tuple[int, int, Optional[List[Dict]]]:
+    method, variable_bool, value_bool, engine, count_bool, prefix = args
+    worker_csp.steps = 0
+    count = 0
+    solutions = None if count_bool else []
+    for solution in worker_csp.iter_solutions(method, variable_bool, value_bool, assignment=prefix, engine=engine, symmetry="canonical"):
+        count += worker_csp.symmetric_count(solution)
+        if not count_bool:
+            solutions.append(solution)
+    return worker_csp.steps, count, solutions
+
+
+# splits top levels of search tree into at least `subproblems` partial assignments
+# each level extends prefixes of the previous one by one variable (search below prefix starts from it, as in workers)
+def split_search(csp: CSP, method: str, variable_bool: bool, value_bool: bool, engine: str, subproblems: int) -> List[Dict]:
+    prefixes = list(csp.iter_solutions(method, variable_bool, value_bool, engine=engine, max_depth=1))
+    depth = 1
+    while 0 < len(prefixes) < subproblems and depth < len(csp.variables):
+        prefixes = [extended for prefix in prefixes
+                    for extended in csp.iter_solutions(method, variable_bool, value_bool, assignment=prefix, engine=engine, max_depth=1)]
+        depth += 1
+    return prefixes
+
+
+# all solutions (or their number if count_bool) found by process pool, order of solutions same as in single process
+def parallel_search(csp: CSP, method: str, variable_bool: bool, value_bool: bool, count_bool: bool = False, workers: Optional[int] = None,
+                    engine: str = "ac3", split_factor: int = 8) -> Union[int, Optional[List[Dict]]]:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # many small subproblems handed out one by one - free workers take next ones
+    prefixes = split_search(csp, method, variable_bool, value_bool, engine, workers * split_factor)
+    tasks = [(method, variable_bool, value_bool, engine, count_bool, prefix) for prefix in prefixes]
+
+    count = 0
+    results = []
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(csp,)) as executor:
+        for steps, sub_count, solutions in executor.map(solve_subproblem, tasks, chunksize=1):
+            csp.steps += steps
+            count += sub_count
+            if not count_bool:
+                results.extend(image for solution in solutions for image in csp.symmetric_solutions(solution))
+
+    if count_bool:
+        return count
+    if len(results) != 0:
+        return results
+    else:
+        return None
+
+
+# number of solutions or first solution of one independent component
+def solve_component(args) -> Tuple[int, Union[int, Optional[Dict]]]:
+    sub, method, variable_bool, value_bool, engine, count_bool = args
+    if count_bool:
+        return sub.steps, sub.count_solutions()
+    result = next(sub.iter_solutions(method, variable_bool, value_bool, engine=engine), None)
+    return sub.steps, result
+
+
+# components of constraint graph solved by process pool - number of solutions (product of numbers of components)
+# or first solution (None if some component has none)
+def parallel_components(csp: CSP, method: str, variable_bool: bool, value_bool: bool, count_bool: bool = False,
+                        workers: Optional[int] = None, engine: str = "ac3") -> Union[int, Optional[Dict]]:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # biggest components first - they take the longest
+    subproblems = [csp.subproblem(variables) for variables in sorted(csp.components(), key=len, reverse=True)]
+    for sub in subproblems: # statistics are not collected in workers
+        sub.stats = None
+    tasks = [(sub, method, variable_bool, value_bool, engine, count_bool) for sub in subproblems]
+
+    count = 1
+    parts = []
+    with ProcessPoolExecutor(workers) as executor:
+        for steps, result in executor.map(solve_component, tasks, chunksize=1):
+            csp.steps += steps
+            if count_bool:
+                count *= result
+            else:
+                parts.append(result)
+
+    if count_bool:
+        return count
+    if any(part is None for part in parts):
+        return None
+    return merge_solutions(tuple(parts))
+
+
+# first solution of one configuration, sent back with number of configuration
+def run_configuration(csp: CSP, index: int, configuration: Tuple[str, bool, bool], engine: str, seed: int, results: Queue) -> None:
+    method, variable_bool, value_bool = configuration
+    csp.steps = 0
+    try:
+        solution = next(csp.iter_solutions(method, variable_bool, value_bool, engine=engine, seed=seed), None)
+    except Exception as error: # passed to main process instead of leaving it waiting
+        results.put((index, error, csp.steps))
+        return
+    results.put((index, solution, csp.steps))
+
+
+# runs configurations at the same time, returns first found solution (None if there is none) and configuration which found it
+# every configuration is complete, so the first one to finish decides - the others are stopped
+def portfolio_search(csp: CSP, configurations: Optional[List[Tuple[str, bool, bool]]] = None, workers: Optional[int] = None,
+                     engine: str = "ac3", seed: int = 0) -> Tuple[Optional[Dict], Optional[Tuple[str, bool, bool]]]:
+    if configurations is None:
+        configurations = CONFIGURATIONS
+    if workers is None:
+        workers = os.cpu_count() or 1
+    configurations = configurations[:max(workers, 1)]
+
+    results = Queue()
+    processes = [Process(target=run_configuration, args=(csp, index, configuration, engine, seed + index, results), daemon=True)
+                 for index, configuration in enumerate(configurations)]
+    for process in processes:
+        process.start()
+    try:
+        exited = False
+        while True: # killed processes send nothing - they are watched instead of waiting forever
+            try:
+                index, solution, steps = results.get(timeout=0.1)
+                break
+            except Empty:
+                if exited:
+                    raise RuntimeError("All configurations exited without result")
+                # results sent just before exit may still be on their way - one more wait
+                exited = all(process.exitcode is not None for process in processes)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+    if isinstance(solution, Exception):
+        raise solution
+    csp.steps += steps
+    return solution, configurations[index]
+
+
+if __name__ == "__main__":
+    from map_coloring import map_coloring_csp, random_board
+    # colors are declared interchangeable - each solution must come back once, in order of single process search
+    csp = map_coloring_csp(random_board(30, 30, 8, seed=3, k=4))
+    sequential = list(csp.iter_solutions("mac"))
+    solutions = parallel_search(csp, "mac", False, False, workers=2)
+    count = parallel_search(csp, "mac", False, False, count_bool=True, workers=2)
+    print("Solutions:", len(sequential), "parallel:", len(solutions or []), "counted:", count)
+    if solutions != sequential or count != len(sequential):
+        raise SystemExit("Parallel search differs from single process search")
+    # renamings must keep values of given part of solution
+    given = {csp.variables[0]: csp.domains[csp.variables[0]][0]}
+    expanded = [frozenset(solution.items()) for solution in csp.iter_solutions("mac", assignment=given)]
+    plain = [frozenset(solution.items()) for solution in csp.iter_solutions("mac", assignment=given, symmetry="none")]
+    print("Solutions with", given, ":", len(expanded), "without symmetry:", len(plain))
+    if len(expanded) != len(plain) or set(expanded) != set(plain):
+        raise SystemExit("Symmetric solutions differ from search without symmetry")